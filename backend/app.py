@@ -1,18 +1,77 @@
-from flask import Flask, request, jsonify, render_template_string, send_from_directory
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, g, request, jsonify, render_template_string, send_file, Request, Response, stream_with_context
 from flask_cors import CORS
-import google.generativeai as genai
 import os
 import json
 import logging
-from datetime import datetime
-import speech_recognition as sr
+from datetime import datetime, timezone
 import io
 from werkzeug.utils import secure_filename
+from werkzeug.middleware.proxy_fix import ProxyFix
 import tempfile
 from dotenv import load_dotenv
-import PyPDF2
-from PIL import Image
-import base64
+import importlib
+import threading
+import sqlite3
+import hashlib
+import re
+import codecs
+import multiprocessing
+import audioop
+import uuid
+import sys
+import hmac
+import cProfile
+import gzip
+import mimetypes
+from concurrent.futures import Future, ThreadPoolExecutor
+import subprocess
+import shutil
+import random
+import math
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+
+from content_build import (
+    FAQ_INDEX_DIR, TUTORIAL_LANGUAGES, TUTORIALS_PATH, faq_sources, faq_terms, file_sha256,
+    load_tutorial_translations, tutorial_source_hash, tutorial_translations_path
+)
+
+try:
+    import brotli  # Optional dependency; without it only gzip is offered
+except ImportError:
+    brotli = None
+
+class LazyModule:
+    """Proxy for a heavy module that is imported on first attribute access"""
+    load_times = {}  # module name -> seconds spent importing
+    
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+    
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                started = time.perf_counter()
+                module = importlib.import_module(self._name)
+                LazyModule.load_times[self._name] = round(time.perf_counter() - started, 4)
+                self._module = module
+        return self._module
+    
+    def __getattr__(self, attr):
+        return getattr(self._module or self._load(), attr)
+
+genai = LazyModule('google.generativeai')
+sr = LazyModule('speech_recognition')
+PyPDF2 = LazyModule('PyPDF2')
+Image = LazyModule('PIL.Image')
+ImageOps = LazyModule('PIL.ImageOps')
+google_exceptions = LazyModule('google.api_core.exceptions')
+np = LazyModule('numpy')
 
 # Load environment variables from .env.local
 load_dotenv('backend/.env.local')
@@ -22,100 +81,2237 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__, static_folder="../frontend/dist", static_url_path="/")
-CORS(app, origins=["https://relaxed-pastelito-d8b94b.netlify.app/"])
+CORS(app, origins=["https://relaxed-pastelito-d8b94b.netlify.app/"], expose_headers=["X-Request-ID"])
+
+# Metrics and tracing configuration
+TRACE_IDS = os.getenv('TRACE_IDS', 'true').lower() == 'true'  # Propagate X-Request-ID on responses
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (100, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for name, value in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+class Histogram:
+    metric_type = 'histogram'
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+    
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            state = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+    
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, state in self._values.items():
+                for bound, count in zip(self.buckets, state):
+                    samples.append((self.name + "_bucket" + _format_labels(self.labelnames, key, [("le", bound)]), count))
+                samples.append((self.name + "_bucket" + _format_labels(self.labelnames, key, [("le", "+Inf")]), state[-1]))
+                samples.append((self.name + "_sum" + _format_labels(self.labelnames, key), state[-2]))
+                samples.append((self.name + "_count" + _format_labels(self.labelnames, key), state[-1]))
+        return samples
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time"""
+    metric_type = 'gauge'
+    
+    def __init__(self, name, documentation, callback):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+    
+    def samples(self):
+        try:
+            return [(self.name, self.callback())]
+        except Exception as e:
+            logger.error(f"Error collecting metric {self.name}: {str(e)}")
+            return []
+
+class CallbackCounter(Gauge):
+    """Cumulative counter whose value is read from a callback at scrape time"""
+    metric_type = 'counter'
+
+class MetricsRegistry:
+    """Per-process metrics rendered in the Prometheus text exposition format"""
+    def __init__(self):
+        self.metrics = []
+    
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+    
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            lines.extend(f"{name} {value}" for name, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+request_latency = metrics.register(Histogram(
+    'dlh_http_request_duration_seconds', 'HTTP request latency by route', ('route', 'method', 'status')))
+stage_latency = metrics.register(Histogram(
+    'dlh_stage_duration_seconds', 'Latency of processing stages', ('stage',)))
+prompt_size = metrics.register(Histogram(
+    'dlh_prompt_chars', 'Size of prompts sent to Gemini in characters', buckets=SIZE_BUCKETS))
+response_size = metrics.register(Histogram(
+    'dlh_response_chars', 'Size of Gemini responses in characters', buckets=SIZE_BUCKETS))
+
+@contextmanager
+def timed_stage(stage):
+    """Record how long a processing stage takes"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_latency.observe(time.perf_counter() - started, stage=stage)
+
+def after_body(response, callback):
+    """Run callback once the response body has been sent.
+    
+    Streamed bodies (SSE, NDJSON) are produced after the view and its
+    after_request hooks return, so they are wrapped; file responses are left
+    alone to keep the server's sendfile path.
+    """
+    if not response.is_streamed or response.direct_passthrough:
+        callback()
+        return
+    body = response.response
+    
+    def finished_body():
+        try:
+            yield from body
+        finally:
+            callback()
+    
+    response.response = finished_body()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    if TRACE_IDS:
+        traceparent = request.headers.get('traceparent', '')
+        g.trace_id = (request.headers.get('X-Request-ID')
+                      or (traceparent.split('-')[1] if traceparent.count('-') == 3 else None)
+                      or uuid.uuid4().hex)
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        labels = dict(route=route, method=request.method, status=response.status_code)
+        after_body(response, lambda: request_latency.observe(time.perf_counter() - started, **labels))
+    if TRACE_IDS and g.get('trace_id'):
+        response.headers['X-Request-ID'] = g.trace_id
+    return response
+
+# Request profiling: a sampled or header-triggered profile is kept when the request is slow
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))  # Fraction of requests profiled; 0 disables sampling
+PROFILE_MODE = os.getenv('PROFILE_MODE', 'sampling')  # sampling (stacks of all threads) or cprofile (request thread only)
+PROFILE_SLOW_THRESHOLD = float(os.getenv('PROFILE_SLOW_THRESHOLD', '2.0'))  # Seconds; faster sampled profiles are discarded
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '50'))  # Oldest profiles are removed beyond this
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')  # Enables /api/admin/* and the X-Profile header; unset disables both
+PROFILE_SKIP_ENDPOINTS = {'static', 'home', 'get_metrics', 'health_check', 'list_profiles', 'download_profile'}
+
+class StackSampler:
+    """Periodically samples the stacks of every thread into collapsed-stack counts.
+    
+    Async views and to_thread work run outside the request thread, so all
+    threads are sampled; each stack is rooted at its thread name.
+    """
+    extension = 'txt'
+    
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+    
+    def start(self):
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+    
+    def _run(self):
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.counts[";".join(reversed(stack))] += 1
+    
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+class CProfileRecorder:
+    """Deterministic cProfile of the request thread, saved in pstats format"""
+    extension = 'pstats'
+    
+    def __init__(self):
+        self.profile = cProfile.Profile()
+    
+    def start(self):
+        self.profile.enable()
+    
+    def stop(self):
+        self.profile.disable()
+    
+    def save(self, path):
+        self.profile.dump_stats(path)
+
+profilers = {'sampling': StackSampler, 'cprofile': CProfileRecorder}
+
+class ProfileStore:
+    """Bounded on-disk ring buffer of request profiles, each with a JSON sidecar"""
+    id_pattern = re.compile(r"^[0-9]+-[0-9a-f]{32}$")
+    
+    def __init__(self, directory=PROFILE_DIR, max_profiles=PROFILE_MAX_FILES):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+    
+    def save(self, profiler, meta):
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex}"
+        filename = f"{profile_id}.{profiler.extension}"
+        profiler.save(os.path.join(self.directory, filename))
+        meta = dict(meta, id=profile_id, filename=filename,
+                    bytes=os.path.getsize(os.path.join(self.directory, filename)))
+        # The sidecar is written last so listings never show a half-written profile
+        tmp_path = os.path.join(self.directory, profile_id + '.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self.directory, profile_id + '.json'))
+        self._prune()
+        return profile_id
+    
+    def _sidecars(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((name for name in names if name.endswith('.json')), reverse=True)
+    
+    def _prune(self):
+        with self._lock:
+            for name in self._sidecars()[self.max_profiles:]:
+                profile_id = name[:-len('.json')]
+                for extension in ('json',) + tuple(profiler.extension for profiler in profilers.values()):
+                    try:
+                        os.remove(os.path.join(self.directory, f"{profile_id}.{extension}"))
+                    except FileNotFoundError:
+                        pass  # Already pruned by another worker
+    
+    def list(self):
+        entries = []
+        for name in self._sidecars():
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    entries.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # Pruned while listing
+        return entries
+    
+    def get(self, profile_id):
+        """Return (path, meta) for a stored profile, or None"""
+        if not self.id_pattern.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, profile_id + '.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return os.path.join(self.directory, meta['filename']), meta
 
+profile_store = ProfileStore()
 
-# Configure Gemini API
+def admin_authorized():
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+@app.before_request
+def start_request_profile():
+    if request.endpoint in PROFILE_SKIP_ENDPOINTS:
+        return
+    requested = request.headers.get('X-Profile')
+    if requested and admin_authorized():
+        mode = requested if requested in profilers else PROFILE_MODE
+        g.profile_trigger = 'header'
+    elif PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        mode = PROFILE_MODE
+        g.profile_trigger = 'sampled'
+    else:
+        return
+    try:
+        profiler = profilers[mode]()
+        profiler.start()
+    except (KeyError, ValueError) as e:
+        # ValueError: another profiler (e.g. a concurrent cProfile) is already active on this thread
+        logger.error(f"Error starting {mode} profile: {str(e)}")
+        return
+    g.profiler = profiler
+    g.profile_mode = mode
+    g.profile_started = time.perf_counter()
+
+def save_request_profile(profiler, meta, started):
+    duration = time.perf_counter() - started
+    profiler.stop()
+    if meta["trigger"] != 'header' and duration < PROFILE_SLOW_THRESHOLD:
+        return
+    try:
+        profile_store.save(profiler, dict(meta, duration_ms=round(duration * 1000, 1)))
+    except OSError as e:
+        logger.error(f"Error saving request profile: {str(e)}")
+
+@app.after_request
+def finish_request_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    started = g.profile_started
+    meta = {
+        "route": request.url_rule.rule if request.url_rule else 'unmatched',
+        "endpoint": request.endpoint,
+        "method": request.method,
+        "status": response.status_code,
+        "mode": g.profile_mode,
+        "trigger": g.profile_trigger,
+        "trace_id": g.get('trace_id'),
+        "timestamp": datetime.now().isoformat()
+    }
+    after_body(response, lambda: save_request_profile(profiler, meta, started))
+    return response
+
+
+# Gemini API key; the client itself is configured on first use (see get_model)
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-if not GEMINI_API_KEY:
-    logger.error("GEMINI_API_KEY not found in environment variables")
-    raise ValueError("GEMINI_API_KEY must be set in .env.local file")
 
-genai.configure(api_key=GEMINI_API_KEY)
+# Subsystems to initialize at startup instead of on first use: model, recognizer, pdf, image or all
+WARM_UP = os.getenv('WARM_UP', '')
+
+# Speech recognition configuration
+SPEECH_ENGINE = os.getenv('SPEECH_ENGINE', 'google')  # google, vosk or whisper; requests may override
+SPEECH_SAMPLE_RATE = 16000
+VOSK_MODEL_DIR = os.getenv('VOSK_MODEL_DIR', 'models/vosk')  # One model directory per language, e.g. models/vosk/hi-IN
+WHISPER_MODEL = os.getenv('WHISPER_MODEL', 'base')
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+AUDIO_DECODE_TIMEOUT = float(os.getenv('AUDIO_DECODE_TIMEOUT', '30'))
+
+# Streaming voice recognition (16 kHz mono s16le frames segmented by voice activity)
+VAD_FRAME_MS = 30
+VAD_ENERGY_THRESHOLD = int(os.getenv('VAD_ENERGY_THRESHOLD', '300'))  # RMS above which a frame counts as speech
+VAD_SILENCE_MS = int(os.getenv('VAD_SILENCE_MS', '600'))  # Silence that closes a segment
+VAD_PREROLL_MS = 210
+VOICE_MAX_SEGMENT_MS = int(os.getenv('VOICE_MAX_SEGMENT_MS', '15000'))
+VOICE_STREAM_TTL = int(os.getenv('VOICE_STREAM_TTL', '300'))  # Idle seconds before a stream is dropped
+VOICE_STREAM_WORKERS = int(os.getenv('VOICE_STREAM_WORKERS', '4'))
+VOICE_STREAM_MAX_SECONDS = int(os.getenv('VOICE_STREAM_MAX_SECONDS', '300'))  # Audio accepted per stream
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', '1'))  # Server processes; voice streams live in one process, so they need exactly one
+
+# Upstream concurrency configuration (Gemini and speech recognition calls)
+UPSTREAM_CONCURRENCY = int(os.getenv('UPSTREAM_CONCURRENCY', '64'))
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv('UPSTREAM_QUEUE_TIMEOUT', '30'))
+UPSTREAM_MAX_QUEUE = int(os.getenv('UPSTREAM_MAX_QUEUE', '128'))  # Callers allowed to wait for a slot; the rest get 503 at once
 
-# Initialize Gemini model (using Flash as requested)
-model = genai.GenerativeModel('gemini-1.5-flash')
+# Admission control: token buckets per session_id and per client IP on expensive routes
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_STORE = os.getenv('RATE_LIMIT_STORE', 'memory')  # memory or sqlite (shared by all workers on a host)
+RATE_LIMIT_DB_PATH = os.getenv('RATE_LIMIT_DB_PATH', 'ratelimits.db')
+RATE_LIMIT_SESSION_PER_MINUTE = float(os.getenv('RATE_LIMIT_SESSION_PER_MINUTE', '20'))
+RATE_LIMIT_SESSION_BURST = int(os.getenv('RATE_LIMIT_SESSION_BURST', '10'))
+RATE_LIMIT_IP_PER_MINUTE = float(os.getenv('RATE_LIMIT_IP_PER_MINUTE', '60'))
+RATE_LIMIT_IP_BURST = int(os.getenv('RATE_LIMIT_IP_BURST', '30'))
+RATE_LIMIT_MAX_BUCKETS = 100000
+TRUSTED_PROXIES = int(os.getenv('TRUSTED_PROXIES', '0'))  # Reverse proxies whose X-Forwarded-For is trusted, e.g. 1 on Render
+# Behind a proxy that is not trusted every client has the proxy's address and would share one IP bucket,
+# so per-IP limits are on by default only when TRUSTED_PROXIES is set; session limits apply either way
+RATE_LIMIT_BY_IP = os.getenv('RATE_LIMIT_BY_IP', 'true' if TRUSTED_PROXIES else 'false').lower() == 'true'
 
-# Initialize Speech Recognition
-recognizer = sr.Recognizer()
+# Token cost of each rate-limited endpoint, charged before the view runs. chat_batch questions and voice
+# stream segments are charged inside their routes; other routes (tutorials, health, ...) are never limited
+RATE_LIMITED_ENDPOINTS = {
+    'chat': 1,
+    'chat_stream': 1,
+    'chat_with_image': 2,
+    'voice_to_text': 1,
+    'start_voice_stream': 1,
+    'upload_file': 1
+}
+RATE_LIMIT_VOICE_SEGMENT_COST = 1  # Charged per voice stream segment sent for transcription, whichever route closed it
+RATE_LIMIT_BATCH_ITEM_COST = 1  # Charged per batch question that needs Gemini; the batch waits for tokens instead of failing
+
+# Gemini resilience configuration
+GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', '30'))  # Deadline per attempt
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '2'))
+GEMINI_RETRY_BASE_DELAY = float(os.getenv('GEMINI_RETRY_BASE_DELAY', '0.5'))
+GEMINI_RETRY_MAX_DELAY = float(os.getenv('GEMINI_RETRY_MAX_DELAY', '4'))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', '30'))
+
+# Chat session store configuration
+SESSION_STORE = os.getenv('SESSION_STORE', 'memory')  # memory, sqlite or redis
+SESSION_TTL = int(os.getenv('SESSION_TTL', '3600'))  # Seconds of inactivity before a session expires
+SESSION_MAX_SESSIONS = int(os.getenv('SESSION_MAX_SESSIONS', '10000'))
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', 'sessions.db')
+SESSION_REDIS_URL = os.getenv('SESSION_REDIS_URL', 'redis://localhost:6379/0')
+MAX_HISTORY_MESSAGES = 20
+
+# Prompt assembly budgets
+PROMPT_HISTORY_MESSAGES = 10  # Recent messages sent verbatim; older turns are folded into a summary
+PROMPT_CHAR_BUDGET = int(os.getenv('PROMPT_CHAR_BUDGET', '8000'))  # History, summary and file context
+PROMPT_MESSAGE_CHAR_LIMIT = int(os.getenv('PROMPT_MESSAGE_CHAR_LIMIT', '2000'))
+SUMMARY_CHAR_LIMIT = 1500
+SUMMARY_LINE_CHAR_LIMIT = 160
+PROMPT_SYSTEM_INSTRUCTION = os.getenv('PROMPT_SYSTEM_INSTRUCTION', 'true').lower() == 'true'
+
+# Response cache configuration for repeated opening questions
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '2048'))
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '86400'))
+RESPONSE_CACHE_MAX_HISTORY = int(os.getenv('RESPONSE_CACHE_MAX_HISTORY', '0'))  # Prior messages allowed for a cacheable turn
+
+# Batch chat configuration (pre-answering question lists)
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '500'))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '4'))  # Questions answered in parallel per batch
 
 # File upload configuration
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'mp3', 'wav', 'ogg', 'm4a', 'webm'}
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+UPLOAD_HEAD_BYTES = 8192  # Bytes kept in memory for type sniffing and text previews
+UPLOAD_SPOOL_BYTES = 1024 * 1024  # Uploads up to this size are buffered in memory until committed
+EXTRACTION_CACHE_SIZE = 1024
+
+# PDF extraction budgets; extraction runs in a separate process pool
+PDF_MAX_PAGES = int(os.getenv('PDF_MAX_PAGES', '50'))
+PDF_MAX_CHARS = int(os.getenv('PDF_MAX_CHARS', '2000'))
+PDF_EXTRACT_TIMEOUT = float(os.getenv('PDF_EXTRACT_TIMEOUT', '10'))
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', '2'))  # 0 extracts in the request thread
+# Forking a threaded server process can copy a held lock into the child, so pool workers never use fork
+PDF_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Image preparation before images are sent to Gemini
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', '1536'))
+IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'JPEG').upper()  # JPEG or WEBP
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', '85'))
+IMAGE_CACHE_BYTES = int(os.getenv('IMAGE_CACHE_BYTES', str(64 * 1024 * 1024)))
+IMAGE_FILES = os.getenv('IMAGE_FILES', 'gemini')  # gemini (Files API) or local (in-process stand-in for tests and offline runs)
+IMAGE_HANDLE_MAX = 10000  # Handles kept by the in-memory handle store
+IMAGE_FILE_MAX_AGE = 46 * 3600  # Gemini deletes uploaded files after 48 hours; older ones are registered again
+IMAGE_FILE_CACHE_SIZE = int(os.getenv('IMAGE_FILE_CACHE_SIZE', '1000'))  # Upload URIs remembered per process
+UPLOAD_MAX_AGE = int(os.getenv('UPLOAD_MAX_AGE', str(24 * 3600)))  # Seconds before an upload is evicted
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', str(512 * 1024 * 1024)))  # Size cap for the upload folder
+UPLOAD_GC_INTERVAL = int(os.getenv('UPLOAD_GC_INTERVAL', '60'))  # Minimum seconds between retention sweeps
+
+# Background processing of uploads whose extraction can be slow
+DEFERRED_EXTRACTION_TYPES = {'pdf'}  # Other types only look at the head or image header and are processed inline
+UPLOAD_JOBS_DB_PATH = os.getenv('UPLOAD_JOBS_DB_PATH', 'upload_jobs.db')
+UPLOAD_JOB_WORKERS = int(os.getenv('UPLOAD_JOB_WORKERS', '2'))  # Worker threads per process
+UPLOAD_JOB_MAX_ATTEMPTS = int(os.getenv('UPLOAD_JOB_MAX_ATTEMPTS', '3'))
+UPLOAD_JOB_RETRY_DELAY = float(os.getenv('UPLOAD_JOB_RETRY_DELAY', '2'))  # Doubled after every failed attempt
+UPLOAD_JOB_LEASE = int(os.getenv('UPLOAD_JOB_LEASE', '300'))  # Seconds before a job left running by a dead worker is retaken
+UPLOAD_JOB_TTL = 24 * 3600  # Finished jobs are kept this long for status queries
+UPLOAD_JOB_POLL_INTERVAL = 1.0
+
+app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+_created_upload_folders = set()
+
+def upload_folder():
+    """Return the configured upload folder, creating it on first use"""
+    folder = app.config['UPLOAD_FOLDER']
+    if folder not in _created_upload_folders:
+        os.makedirs(folder, exist_ok=True)
+        _created_upload_folders.add(folder)
+    return folder
+
+
+# Static asset and response compression configuration
+STATIC_PRECOMPRESS = os.getenv('STATIC_PRECOMPRESS', 'true').lower() == 'true'  # Write missing .br/.gz variants at startup
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', '3600'))  # For unhashed files other than index.html
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+STATIC_HASHED_PATTERN = re.compile(r"^assets/.+[-.][A-Za-z0-9_-]{8,}\.[a-z0-9]+$")  # Vite's content-hashed output
+COMPRESSIBLE_EXTENSIONS = {'.js', '.mjs', '.css', '.html', '.svg', '.json', '.txt', '.map', '.xml', '.webmanifest'}
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))  # Smaller bodies are sent uncompressed
+COMPRESS_LEVEL = 6  # gzip level for on-the-fly compression; brotli uses quality 5
+COMPRESS_ENCODINGS = ['br', 'gzip'] if brotli is not None else ['gzip']  # In order of preference
+
+# Tutorial catalog configuration; data paths and languages are defined in content_build
+TUTORIALS_PER_PAGE = 20
+
+# Feedback storage configuration
+FEEDBACK_DB_PATH = os.getenv('FEEDBACK_DB_PATH', 'feedback.db')
+FEEDBACK_PAGE_SIZE = 50
+FEEDBACK_MAX_PAGE_SIZE = 200
+
+# FAQ retrieval over the curated FAQ and the tutorial catalog; rebuild the index with build_faq_index.py
+FAQ_ANSWER_THRESHOLD = float(os.getenv('FAQ_ANSWER_THRESHOLD', '0.8'))  # Similarity at which the FAQ answer is served as is
+FAQ_GROUNDING_THRESHOLD = float(os.getenv('FAQ_GROUNDING_THRESHOLD', '0.35'))  # Similarity at which a match is added to the prompt
+FAQ_GROUNDING_SNIPPETS = 3
+
+class UpstreamUnavailableError(Exception):
+    """Raised when an upstream call is refused without being attempted"""
+    retry_after = 1
+
+class UpstreamBusyError(UpstreamUnavailableError):
+    """Raised when the wait queue is full or no upstream call slot frees up within the queue timeout"""
+
+class CircuitOpenError(UpstreamUnavailableError):
+    """Raised while the circuit breaker is failing calls fast"""
+    def __init__(self, retry_after):
+        super().__init__()
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+class UpstreamLimiter:
+    """Bound the number of outstanding calls to Gemini and the speech service.
+    
+    At most ``max_waiting`` callers queue for a slot; further callers are
+    refused immediately instead of piling up behind a saturated upstream.
+    """
+    def __init__(self, limit, timeout, max_waiting=UPSTREAM_MAX_QUEUE):
+        self.limit = limit
+        self.timeout = timeout
+        self.max_waiting = max_waiting
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+    
+    def _enter(self):
+        with self._lock:
+            self.in_flight += 1
+    
+    def _join_queue(self):
+        with self._lock:
+            if self.waiting >= self.max_waiting:
+                raise UpstreamBusyError()
+            self.waiting += 1
+    
+    def _leave_queue(self):
+        with self._lock:
+            self.waiting -= 1
+    
+    def _wait_for_slot(self):
+        self._join_queue()
+        try:
+            return self._semaphore.acquire(timeout=self.timeout)
+        finally:
+            self._leave_queue()
+    
+    def __enter__(self):
+        if not self._semaphore.acquire(blocking=False) and not self._wait_for_slot():
+            raise UpstreamBusyError()
+        self._enter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+        return False
+    
+upstream_limiter = UpstreamLimiter(UPSTREAM_CONCURRENCY, UPSTREAM_QUEUE_TIMEOUT)
+
+class InMemoryTokenBuckets:
+    """Per-process token buckets, bounded by evicting the least recently used bucket"""
+    def __init__(self, max_buckets=RATE_LIMIT_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+    
+    def take(self, key, rate, burst, cost=1):
+        """Take ``cost`` tokens; return 0 if allowed, otherwise seconds until they are available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return 0 if allowed else (cost - tokens) / rate
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._buckets)
+
+class SQLiteConnections:
+    """One connection per thread to a SQLite database in WAL mode.
+    
+    The database is opened and its schema created on first use, so
+    importing the app touches no files.
+    """
+    def __init__(self, path, schema, timeout=10, isolation_level='', synchronous='NORMAL', row_factory=None):
+        self.path = path
+        self.schema = schema
+        self.timeout = timeout
+        self.isolation_level = isolation_level
+        self.synchronous = synchronous
+        self.row_factory = row_factory
+        self._local = threading.local()
+    
+    def get(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=self.isolation_level)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            with conn:
+                for statement in self.schema:
+                    conn.execute(statement)
+            conn.row_factory = self.row_factory
+            self._local.conn = conn
+        return conn
+
+class SQLiteTokenBuckets:
+    """Token buckets shared by all workers on a host via SQLite in WAL mode"""
+    schema = (
+        "CREATE TABLE IF NOT EXISTS rate_limits ("
+        "bucket TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_rate_limits_updated ON rate_limits (updated_at)"
+    )
+    
+    def __init__(self, path=RATE_LIMIT_DB_PATH, max_buckets=RATE_LIMIT_MAX_BUCKETS):
+        # Autocommit mode so take() can hold a write lock across its read and update
+        self._connections = SQLiteConnections(path, self.schema, timeout=5, isolation_level=None)
+        self.max_buckets = max_buckets
+        self._takes = 0
+    
+    def _connect(self):
+        return self._connections.get()
+    
+    def take(self, key, rate, burst, cost=1):
+        """Take ``cost`` tokens; return 0 if allowed, otherwise seconds until they are available"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM rate_limits WHERE bucket = ?", (key,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute(
+                "INSERT INTO rate_limits (bucket, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(bucket) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (key, tokens, now)
+            )
+            self._takes += 1
+            if self._takes % 1000 == 0:
+                # Buckets idle this long are full again, so dropping them loses nothing
+                conn.execute("DELETE FROM rate_limits WHERE updated_at < ?", (now - burst / rate,))
+                conn.execute(
+                    "DELETE FROM rate_limits WHERE bucket IN ("
+                    "SELECT bucket FROM rate_limits ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_buckets,)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return 0 if allowed else (cost - tokens) / rate
+    
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+
+def create_token_buckets(backend=RATE_LIMIT_STORE):
+    if backend == 'sqlite':
+        return SQLiteTokenBuckets()
+    return InMemoryTokenBuckets()
+
+rate_limit_buckets = create_token_buckets()
+
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
+
+def client_ip():
+    # remote_addr reflects X-Forwarded-For when TRUSTED_PROXIES is set
+    return request.remote_addr or 'unknown'
+
+def rate_limit_session_id():
+    """Session ID of a rate-limited request, or None when the client did not send one"""
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        session_id = data.get('session_id') if isinstance(data, dict) else None
+    else:
+        session_id = request.form.get('session_id')
+    # The shared 'default' session is covered by the per-IP bucket alone
+    return session_id if session_id and session_id != 'default' else None
+
+def rate_limited_response(retry_after, body=None):
+    response = jsonify(dict(body or {}, error="Too many requests. Please wait a moment before trying again."))
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response, 429
+
+def take_rate_limit_tokens(cost, ip, get_session_id=lambda: None):
+    """Charge cost tokens to the IP bucket, then the session bucket; return 0 if allowed, else seconds to wait"""
+    if not RATE_LIMIT_ENABLED:
+        return 0
+    try:
+        # Check the IP bucket first so flooded requests are refused before their body is parsed
+        retry_after = 0
+        if RATE_LIMIT_BY_IP:
+            retry_after = rate_limit_buckets.take(f"ip:{ip}", RATE_LIMIT_IP_PER_MINUTE / 60, RATE_LIMIT_IP_BURST, cost)
+        if not retry_after:
+            session_id = get_session_id()
+            if session_id:
+                retry_after = rate_limit_buckets.take(f"session:{session_id}", RATE_LIMIT_SESSION_PER_MINUTE / 60, RATE_LIMIT_SESSION_BURST, cost)
+    except sqlite3.Error as e:
+        # Fail open: a broken limiter store should not take the assistant down with it
+        logger.error(f"Rate limiter error: {str(e)}")
+        return 0
+    return retry_after
+
+@app.before_request
+def enforce_rate_limits():
+    cost = RATE_LIMITED_ENDPOINTS.get(request.endpoint)
+    if cost is None:
+        return None
+    
+    retry_after = take_rate_limit_tokens(cost, client_ip(), rate_limit_session_id)
+    if retry_after:
+        logger.warning(f"Rate limited {request.endpoint} request from {client_ip()}")
+        return rate_limited_response(retry_after)
+    return None
+
+class InMemorySessionStore:
+    """Per-process chat history store with LRU eviction and idle expiry"""
+    def __init__(self, ttl=SESSION_TTL, max_sessions=SESSION_MAX_SESSIONS, max_messages=MAX_HISTORY_MESSAGES):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self._sessions = OrderedDict()  # session_id -> (last_access, messages)
+        self._lock = threading.Lock()
+    
+    def get(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return []
+            last_access, messages = entry
+            if time.monotonic() - last_access > self.ttl:
+                del self._sessions[session_id]
+                return []
+            self._sessions.move_to_end(session_id)
+            return list(messages)
+    
+    def save(self, session_id, messages):
+        with self._lock:
+            self._sessions[session_id] = (time.monotonic(), list(messages[-self.max_messages:]))
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+    
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+    
+    def ping(self):
+        pass
+
+class SQLiteSessionStore:
+    """Chat history store shared by all workers on a host via SQLite in WAL mode"""
+    schema = (
+        "CREATE TABLE IF NOT EXISTS chat_sessions ("
+        "session_id TEXT PRIMARY KEY, messages TEXT NOT NULL, updated_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated ON chat_sessions (updated_at)"
+    )
+    
+    def __init__(self, path=SESSION_DB_PATH, ttl=SESSION_TTL, max_sessions=SESSION_MAX_SESSIONS, max_messages=MAX_HISTORY_MESSAGES):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self._connections = SQLiteConnections(path, self.schema)
+    
+    def _connect(self):
+        return self._connections.get()
+    
+    def get(self, session_id):
+        row = self._connect().execute(
+            "SELECT messages FROM chat_sessions WHERE session_id = ? AND updated_at >= ?",
+            (session_id, time.time() - self.ttl)
+        ).fetchone()
+        return json.loads(row[0]) if row else []
+    
+    def save(self, session_id, messages):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO chat_sessions (session_id, messages, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET messages = excluded.messages, updated_at = excluded.updated_at",
+                (session_id, json.dumps(messages[-self.max_messages:]), now)
+            )
+            # Expire idle sessions and enforce the session cap
+            conn.execute("DELETE FROM chat_sessions WHERE updated_at < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM chat_sessions WHERE session_id IN ("
+                "SELECT session_id FROM chat_sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,)
+            )
+    
+    def delete(self, session_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
+    
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0]
+    
+    def ping(self):
+        self._connect().execute("SELECT 1")
+
+class RedisSessionStore:
+    """Chat history store backed by any server speaking the Redis protocol"""
+    def __init__(self, url=SESSION_REDIS_URL, ttl=SESSION_TTL, max_messages=MAX_HISTORY_MESSAGES):
+        import redis  # Optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.max_messages = max_messages
+    
+    def _key(self, session_id):
+        return f"chat_session:{session_id}"
+    
+    def get(self, session_id):
+        raw = self.client.get(self._key(session_id))
+        return json.loads(raw) if raw else []
+    
+    def save(self, session_id, messages):
+        # Redis enforces the idle expiry; memory caps are left to maxmemory-policy
+        self.client.set(self._key(session_id), json.dumps(messages[-self.max_messages:]), ex=self.ttl)
+    
+    def delete(self, session_id):
+        self.client.delete(self._key(session_id))
+    
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(match="chat_session:*"))
+    
+    def ping(self):
+        self.client.ping()
+
+def create_session_store(backend=SESSION_STORE):
+    if backend == 'sqlite':
+        return SQLiteSessionStore()
+    if backend == 'redis':
+        return RedisSessionStore()
+    return InMemorySessionStore()
+
+session_store = create_session_store()
+
+class InMemoryImageHandles:
+    """Per-process image handles, expiring SESSION_TTL after their last use"""
+    def __init__(self, ttl=SESSION_TTL, max_handles=IMAGE_HANDLE_MAX):
+        self.ttl = ttl
+        self.max_handles = max_handles
+        self._handles = OrderedDict()  # handle -> (last_access, record)
+        self._lock = threading.Lock()
+    
+    def create(self, record):
+        handle = uuid.uuid4().hex
+        with self._lock:
+            self._handles[handle] = (time.monotonic(), dict(record))
+            while len(self._handles) > self.max_handles:
+                self._handles.popitem(last=False)
+        return handle
+    
+    def get(self, handle, session_id):
+        with self._lock:
+            entry = self._handles.get(handle)
+            if entry is None or entry[1]["session_id"] != session_id:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self._handles[handle]
+                return None
+            self._handles[handle] = (time.monotonic(), entry[1])
+            self._handles.move_to_end(handle)
+            return dict(entry[1])
+    
+    def update(self, handle, **fields):
+        with self._lock:
+            entry = self._handles.get(handle)
+            if entry is not None:
+                entry[1].update(fields)
+    
+    def delete_session(self, session_id):
+        with self._lock:
+            for handle in [h for h, (_, record) in self._handles.items() if record["session_id"] == session_id]:
+                del self._handles[handle]
+
+class SQLiteImageHandles:
+    """Image handles shared by all workers on a host, stored beside the chat sessions"""
+    schema = (
+        "CREATE TABLE IF NOT EXISTS image_handles ("
+        "handle TEXT PRIMARY KEY, session_id TEXT NOT NULL, record TEXT NOT NULL, updated_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_image_handles_session ON image_handles (session_id)"
+    )
+    
+    def __init__(self, path=SESSION_DB_PATH, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._connections = SQLiteConnections(path, self.schema)
+    
+    def _connect(self):
+        return self._connections.get()
+    
+    def create(self, record):
+        handle = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO image_handles (handle, session_id, record, updated_at) VALUES (?, ?, ?, ?)",
+                (handle, record["session_id"], json.dumps(record), now)
+            )
+            conn.execute("DELETE FROM image_handles WHERE updated_at < ?", (now - self.ttl,))
+        return handle
+    
+    def get(self, handle, session_id):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT record FROM image_handles WHERE handle = ? AND session_id = ? AND updated_at >= ?",
+                (handle, session_id, now - self.ttl)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE image_handles SET updated_at = ? WHERE handle = ?", (now, handle))
+        return json.loads(row[0]) if row else None
+    
+    def update(self, handle, **fields):
+        with self._connect() as conn:
+            row = conn.execute("SELECT record FROM image_handles WHERE handle = ?", (handle,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE image_handles SET record = ? WHERE handle = ?",
+                             (json.dumps(dict(json.loads(row[0]), **fields)), handle))
+    
+    def delete_session(self, session_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM image_handles WHERE session_id = ?", (session_id,))
+
+class RedisImageHandles:
+    """Image handles in Redis, expiring with the same idle TTL as the chat sessions"""
+    def __init__(self, url=SESSION_REDIS_URL, ttl=SESSION_TTL):
+        import redis  # Optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+    
+    def create(self, record):
+        handle = uuid.uuid4().hex
+        session_key = f"image_handles:{record['session_id']}"
+        self.client.set(f"image_handle:{handle}", json.dumps(record), ex=self.ttl)
+        self.client.sadd(session_key, handle)
+        self.client.expire(session_key, self.ttl)
+        return handle
+    
+    def get(self, handle, session_id):
+        raw = self.client.getex(f"image_handle:{handle}", ex=self.ttl)
+        record = json.loads(raw) if raw else None
+        return record if record and record["session_id"] == session_id else None
+    
+    def update(self, handle, **fields):
+        raw = self.client.get(f"image_handle:{handle}")
+        if raw:
+            self.client.set(f"image_handle:{handle}", json.dumps(dict(json.loads(raw), **fields)), keepttl=True)
+    
+    def delete_session(self, session_id):
+        session_key = f"image_handles:{session_id}"
+        handles = self.client.smembers(session_key)
+        if handles:
+            self.client.delete(*[f"image_handle:{handle.decode()}" for handle in handles])
+        self.client.delete(session_key)
+
+def create_image_handle_store(backend=SESSION_STORE):
+    if backend == 'sqlite':
+        return SQLiteImageHandles()
+    if backend == 'redis':
+        return RedisImageHandles()
+    return InMemoryImageHandles()
+
+image_handles = create_image_handle_store()
+
+class ResponseCache:
+    """Size-bounded LRU cache with TTL for answers to first-turn questions"""
+    def __init__(self, max_size=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, response)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+    
+    def set(self, key, response):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+response_cache = ResponseCache()
+
+def normalize_message(message):
+    """Normalize a user message so trivially different phrasings share a cache key"""
+    message = re.sub(r"\s+", " ", message.strip().lower())
+    return message.rstrip("?!.। ")
+
+def system_context_hash():
+    """Hash of the system context so cached answers are dropped when it changes"""
+    global _system_context_hash
+    if _system_context_hash is None:
+        _system_context_hash = hashlib.sha256(get_digital_literacy_context().encode('utf-8')).hexdigest()
+    return _system_context_hash
+
+_system_context_hash = None
+
+def response_cache_key(history, user_message, language, file_context=''):
+    """Return the cache key for a chat turn, or None if the turn is not cacheable"""
+    # history includes the current user message
+    if file_context or len(history) - 1 > RESPONSE_CACHE_MAX_HISTORY:
+        return None
+    key_source = "\x1f".join([normalize_message(user_message), language, system_context_hash()])
+    return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+def generate_content(content):
+    """Run a Gemini generation within the upstream limit"""
+    with upstream_limiter, timed_stage('gemini_call'):
+        return get_model().generate_content(content)
+
+def upstream_busy_response(error=None):
+    response = jsonify({"error": "The assistant is busy right now. Please try again in a moment."})
+    response.headers['Retry-After'] = str(error.retry_after if error else UpstreamUnavailableError.retry_after)
+    return response, 503
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+class UploadSink:
+    """Writable target for an uploaded file part.
+    
+    The multipart parser writes the request body into this object as it is
+    read, so the upload is hashed and sniffed without a second pass. Small
+    uploads stay in memory and larger ones spill into the upload folder, so
+    a duplicate of an already stored file is dropped before (small) or
+    instead of (large) being written to its final location.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._file = io.BytesIO()
+        self._spilled = False
+        self.sha256 = hashlib.sha256()
+        self.head = bytearray()
+        self.size = 0
+        self.committed = False
+    
+    def write(self, data):
+        self.sha256.update(data)
+        if len(self.head) < UPLOAD_HEAD_BYTES:
+            self.head += data[:UPLOAD_HEAD_BYTES - len(self.head)]
+        self.size += len(data)
+        if not self._spilled and self.size > UPLOAD_SPOOL_BYTES:
+            self._spill()
+        return self._file.write(data)
+    
+    def _spill(self):
+        spooled = self._file.getvalue()
+        self._file = tempfile.NamedTemporaryFile(dir=self.directory, prefix='.incoming_', delete=False)
+        self._file.write(spooled)
+        self._spilled = True
+    
+    def __getattr__(self, name):
+        # read, seek, tell, etc. for FileStorage consumers such as save()
+        return getattr(self._file, name)
+    
+    def commit(self, filepath):
+        """Move the received file to its final location"""
+        if not self._spilled:
+            self._spill()
+        self._file.close()
+        os.replace(self._file.name, filepath)
+        self.committed = True
+    
+    def discard(self):
+        if self.committed:
+            return
+        self._file.close()
+        if self._spilled:
+            try:
+                os.unlink(self._file.name)
+            except FileNotFoundError:
+                pass
+
+class UploadRequest(Request):
+    """Request class that streams upload-file parts into UploadSink objects"""
+    upload_endpoints = {'upload_file'}
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint not in self.upload_endpoints:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        sink = UploadSink(upload_folder())
+        self.__dict__.setdefault('upload_sinks', []).append(sink)
+        return sink
+
+app.request_class = UploadRequest
+
+@app.teardown_request
+def discard_upload_sinks(exc):
+    for sink in request.__dict__.get('upload_sinks', []):
+        sink.discard()
+
+def sniff_file_type(head):
+    """Detect the file type from its leading bytes"""
+    if head.startswith(b'%PDF-'):
+        return 'pdf'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if head.startswith((b'GIF87a', b'GIF89a')):
+        return 'gif'
+    if b'\x00' not in head:
+        return 'text'
+    return None
+
+def decode_text_preview(head, limit=2000):
+    """Decode the first characters of a UTF-8 upload, tolerating a cut multi-byte sequence"""
+    return codecs.getincrementaldecoder('utf-8')().decode(bytes(head))[:limit]
+
+_last_upload_gc = 0.0
+
+def enforce_upload_retention(force=False):
+    """Evict uploads older than UPLOAD_MAX_AGE, then oldest-first until under UPLOAD_MAX_BYTES"""
+    global _last_upload_gc
+    now = time.time()
+    if not force and now - _last_upload_gc < UPLOAD_GC_INTERVAL:
+        return
+    _last_upload_gc = now
+    
+    entries = []
+    with os.scandir(upload_folder()) as it:
+        for entry in it:
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    
+    entries.sort()
+    total_bytes = sum(size for _, size, _ in entries)
+    for mtime, size, path in entries:
+        if now - mtime <= UPLOAD_MAX_AGE and total_bytes <= UPLOAD_MAX_BYTES:
+            break
+        try:
+            os.unlink(path)
+            total_bytes -= size
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error evicting upload {path}: {str(e)}")
+
+class ExtractionCache:
+    """Upload extraction results keyed by content hash.
+    
+    Results are kept in a small in-process LRU and in a JSON sidecar next to
+    the stored upload, so other workers and restarts reuse them too.
+    """
+    def __init__(self, max_size=EXTRACTION_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _sidecar_path(self, key):
+        return os.path.join(upload_folder(), f"{key}.json")
+    
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        try:
+            with open(self._sidecar_path(key), 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._remember(key, result)
+        return result
+    
+    def set(self, key, result):
+        self._remember(key, result)
+        try:
+            tmp_path = self._sidecar_path(key) + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False)
+            os.replace(tmp_path, self._sidecar_path(key))
+        except OSError as e:
+            logger.error(f"Error writing extraction cache entry: {str(e)}")
+    
+    def _remember(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+extraction_cache = ExtractionCache()
+
+def extract_upload_content(filepath, file_extension, head, raise_timeouts=False):
+    """Extract the chat preview and metadata for a stored upload"""
+    result = {"content_preview": ""}
+    
+    if file_extension == 'txt':
+        try:
+            result["content_preview"] = decode_text_preview(head)  # Limit content length
+        except Exception as e:
+            logger.error(f"Error reading text file: {str(e)}")
+            result["content_preview"] = "Could not read file content"
+            
+    elif file_extension == 'pdf':
+        result["content_preview"], result["pdf_extraction"] = extract_text_from_pdf(filepath, raise_timeouts=raise_timeouts)
+        
+    elif file_extension in ['png', 'jpg', 'jpeg', 'gif']:
+        # For images, we'll process them differently in chat
+        result["is_image"] = True
+        try:
+            with Image.open(filepath) as img:
+                result["image"] = {"width": img.width, "height": img.height, "format": img.format}
+        except Exception as e:
+            logger.error(f"Error reading image metadata: {str(e)}")
+    
+    return result
+
+def _extract_pdf_text(filepath, max_pages, max_chars):
+    """Extract text page by page, stopping once the page or character budget is spent"""
+    pdf_reader = PyPDF2.PdfReader(filepath)
+    parts = []
+    chars = 0
+    pages_parsed = 0
+    for page in pdf_reader.pages:
+        if pages_parsed >= max_pages or chars >= max_chars:
+            break
+        page_text = (page.extract_text() or "") + "\n"
+        parts.append(page_text)
+        chars += len(page_text)
+        pages_parsed += 1
+    return "".join(parts)[:max_chars], pages_parsed, len(pdf_reader.pages)
+
+class PDFExtractionPool:
+    """Worker processes for PDF extraction that can drop a stuck worker without failing the others.
+    
+    When an extraction times out, new extractions go to a fresh pool at once.
+    The old pool is terminated when the last extraction already submitted to
+    it reaches its own deadline, so those still finish (or time out) on their
+    own terms instead of being killed along with the stuck worker.
+    """
+    def __init__(self, workers=PDF_WORKERS, start_method=PDF_START_METHOD):
+        self.workers = workers
+        self.start_method = start_method
+        self._pool = None
+        self._deadline = 0.0  # Latest deadline of the extractions submitted to the current pool
+        self._lock = threading.Lock()
+    
+    def run(self, func, args, timeout):
+        with self._lock:
+            if self._pool is None:
+                context = multiprocessing.get_context(self.start_method)
+                if self.start_method == 'forkserver':
+                    # The fork server imports this module and PyPDF2 once; workers then start as copies of it
+                    context.set_forkserver_preload([__name__, 'PyPDF2'])
+                self._pool = context.Pool(self.workers)
+            pool = self._pool
+            self._deadline = max(self._deadline, time.monotonic() + timeout)
+            pending = pool.apply_async(func, args)
+        try:
+            return pending.get(timeout=timeout)
+        except multiprocessing.TimeoutError:
+            self._retire(pool)
+            raise TimeoutError(f"PDF extraction exceeded {timeout}s")
+    
+    def _retire(self, pool):
+        with self._lock:
+            if self._pool is not pool:
+                return  # Already retired after another extraction timed out
+            self._pool = None
+            grace = max(0.0, self._deadline - time.monotonic())
+            self._deadline = 0.0
+        pool.close()
+        terminator = threading.Timer(grace, pool.terminate)
+        terminator.daemon = True
+        terminator.start()
+
+pdf_pool = PDFExtractionPool()
+
+def extract_text_from_pdf(filepath, max_pages=PDF_MAX_PAGES, max_chars=PDF_MAX_CHARS, timeout=PDF_EXTRACT_TIMEOUT, raise_timeouts=False):
+    """Extract a text preview from a PDF file.
+    
+    Returns (text, stats) where stats reports pages parsed and elapsed time.
+    With raise_timeouts, a timeout is raised so the caller can retry;
+    other errors always produce a placeholder preview.
+    """
+    started = time.perf_counter()
+    stats = {"pages_parsed": 0, "total_pages": None, "elapsed_ms": 0.0}
+    try:
+        if PDF_WORKERS > 0:
+            text, stats["pages_parsed"], stats["total_pages"] = pdf_pool.run(_extract_pdf_text, (filepath, max_pages, max_chars), timeout)
+        else:
+            text, stats["pages_parsed"], stats["total_pages"] = _extract_pdf_text(filepath, max_pages, max_chars)
+    except TimeoutError as e:
+        if raise_timeouts:
+            raise
+        logger.error(f"Error extracting PDF text: {str(e)}")
+        text = "Could not extract text from PDF"
+    except Exception as e:
+        logger.error(f"Error extracting PDF text: {str(e)}")
+        text = "Could not extract text from PDF"
+    elapsed = time.perf_counter() - started
+    stage_latency.observe(elapsed, stage='pdf_extraction')
+    stats["elapsed_ms"] = round(elapsed * 1000, 1)
+    return text, stats
+
+class PreparedImageCache:
+    """LRU cache of prepared image bytes, bounded by total size"""
+    def __init__(self, max_bytes=IMAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            return None
+    
+    def set(self, key, image_data):
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= len(self._entries.pop(key)["data"])
+            self._entries[key] = image_data
+            self.total_bytes += len(image_data["data"])
+            while self.total_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted["data"])
+
+prepared_image_cache = PreparedImageCache()
+
+class SingleFlight:
+    """Run a call once per key at a time; concurrent callers with the same key share its result"""
+    def __init__(self):
+        self._calls = {}  # key -> Future
+        self._lock = threading.Lock()
+    
+    def do(self, key, fn, *args):
+        with self._lock:
+            pending = self._calls.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._calls[key] = Future()
+        if not leader:
+            return pending.result()
+        try:
+            result = fn(*args)
+            pending.set_result(result)
+            return result
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+image_preparation = SingleFlight()
+
+def file_content_hash(filepath):
+    """Content hash of a file, taken from the name for content-addressed uploads"""
+    stem = os.path.basename(filepath).split('.', 1)[0]
+    if len(stem) == 64 and all(c in '0123456789abcdef' for c in stem):
+        return stem
+    return file_sha256(filepath)
+
+def prepare_image(filepath, max_dimension=IMAGE_MAX_DIMENSION, image_format=IMAGE_FORMAT, quality=IMAGE_QUALITY):
+    """Downscale and re-encode an image, dropping EXIF and other metadata"""
+    with timed_stage('image_prep'), Image.open(filepath) as img:
+        img = ImageOps.exif_transpose(img)  # Apply camera orientation before metadata is dropped
+        img.thumbnail((max_dimension, max_dimension))
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel('A'))
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        
+        output = io.BytesIO()
+        img.save(output, format=image_format, quality=quality)
+        return {"mime_type": f"image/{image_format.lower()}", "data": output.getvalue()}
+
+def process_image_file(filepath):
+    """Process image file for Gemini, returning prepared bytes ready to send"""
+    try:
+        key = (file_content_hash(filepath), IMAGE_MAX_DIMENSION, IMAGE_FORMAT, IMAGE_QUALITY)
+        image_data = prepared_image_cache.get(key)
+        if image_data is None:
+            image_data = image_preparation.do(key, prepare_image, filepath)
+            prepared_image_cache.set(key, image_data)
+        return image_data
+    except Exception as e:
+        logger.error(f"Error processing image: {str(e)}")
+        return None
+
+class GeminiImageFiles:
+    """Registers prepared images with the Gemini Files API so turns reference them instead of resending bytes.
+    
+    References carry their upload time and expire after IMAGE_FILE_MAX_AGE,
+    before Gemini deletes the file, so the image is uploaded again instead.
+    """
+    def __init__(self, max_age=IMAGE_FILE_MAX_AGE, max_entries=IMAGE_FILE_CACHE_SIZE):
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._uploaded = OrderedDict()  # prepared image hash -> (file URI, upload time), so identical images are uploaded once
+        self._lock = threading.Lock()
+        self._uploads = SingleFlight()
+    
+    def _cached(self, key):
+        with self._lock:
+            entry = self._uploaded.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[1] > self.max_age:
+                del self._uploaded[key]
+                return None
+            self._uploaded.move_to_end(key)
+            return entry
+    
+    def _upload(self, key, image_data, display_name):
+        entry = self._cached(key)
+        if entry is None:
+            get_model()  # Configures the client
+            uploaded = genai.upload_file(io.BytesIO(image_data["data"]), mime_type=image_data["mime_type"], display_name=display_name)
+            entry = (uploaded.uri, time.time())
+            with self._lock:
+                self._uploaded[key] = entry
+                while len(self._uploaded) > self.max_entries:
+                    self._uploaded.popitem(last=False)
+        return entry
+    
+    def register(self, image_data, display_name):
+        key = hashlib.sha256(image_data["data"]).hexdigest()
+        uri, uploaded_at = self._cached(key) or self._uploads.do(key, self._upload, key, image_data, display_name)
+        return f"{image_data['mime_type']}|{uploaded_at:.0f}|{uri}"
+    
+    def part(self, ref):
+        """Content part for a reference, or None once the upload is too old to rely on"""
+        fields = ref.split('|', 2)
+        if len(fields) != 3 or time.time() - float(fields[1]) > self.max_age:
+            return None  # Registered again by image_part
+        mime_type, _, uri = fields
+        return {"file_data": {"mime_type": mime_type, "file_uri": uri}}
+
+class LocalImageFiles:
+    """In-process stand-in for the Files API, used by tests and offline runs"""
+    def __init__(self):
+        self._files = {}
+        self._lock = threading.Lock()
+        self.registrations = 0
+    
+    def register(self, image_data, display_name):
+        ref = f"local/{hashlib.sha256(image_data['data']).hexdigest()}"
+        with self._lock:
+            if ref not in self._files:
+                self._files[ref] = image_data
+                self.registrations += 1
+        return ref
+    
+    def part(self, ref):
+        with self._lock:
+            return self._files.get(ref)  # None once another process or a restart has to register it again
+
+image_files = LocalImageFiles() if IMAGE_FILES == 'local' else GeminiImageFiles()
+
+def image_part(handle, record):
+    """Content part for an image handle, registering the prepared image on first use"""
+    part = image_files.part(record["file_ref"]) if record.get("file_ref") else None
+    if part is not None:
+        return part
+    
+    image_data = process_image_file(record["filepath"])
+    if image_data is None:
+        return None
+    try:
+        with timed_stage('image_register'):
+            file_ref = image_files.register(image_data, record["filename"])
+    except Exception as e:
+        # Still answer this turn by sending the bytes inline
+        logger.error(f"Error registering image with the model: {str(e)}")
+        return image_data
+    image_handles.update(handle, file_ref=file_ref)
+    return image_files.part(file_ref)
+
+def get_digital_literacy_context():
+    """Return context-specific information for digital literacy assistance"""
+    return """
+    You are TechBuddy, a helpful AI assistant specialized in digital literacy for parents and elderly users.
+    Your role is to help users learn essential digital skills in a simple, patient, and encouraging manner.
+    
+    Key areas you help with:
+    - WhatsApp: messaging, calls, sharing photos, video calls, group chats
+    - Paytm & Digital Payments: account setup, money transfer, bill payments, security
+    - Google Maps: navigation, finding places, getting directions, saving locations
+    - Email & Gmail: account setup, sending/receiving emails, attachments, organization
+    - Social Media Safety: privacy settings, recognizing scams, safe sharing
+    - Online Shopping: trusted sites, secure payments, reading reviews, order tracking
+    
+    Guidelines for responses:
+    - Use simple, clear language
+    - Break down complex tasks into step-by-step instructions
+    - Be patient and encouraging
+    - Provide safety tips when relevant
+    - Ask follow-up questions to better understand user needs
+    - Use examples relevant to Indian context when applicable
+    - Support both English and Hindi languages
+    - If user sends an image, analyze it and provide relevant guidance
+    - If user sends a document, read it and help with digital literacy questions related to it
+    
+    Always be supportive and remember that learning technology can be intimidating for some users.
+    """
+
+def json_bytes(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def cached_json_response(body, etag, last_modified, compressed=None):
+    """Serve pre-serialized JSON with validators so clients can revalidate with a 304.
+    
+    compressed(encoding), if given, returns the body already compressed with
+    that encoding, so compress_json_response leaves the response alone.
+    """
+    encoding = accepted_encoding(COMPRESS_ENCODINGS) if compressed and len(body) >= COMPRESS_MIN_BYTES else None
+    response = Response(compressed(encoding) if encoding else body, mimetype='application/json')
+    if compressed:
+        response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(f"{etag}-{encoding}" if encoding else etag)
+    response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.no_cache = True  # Always revalidate, usually with a cheap 304
+    return response.make_conditional(request)
+
+class TutorialCatalog:
+    """Tutorial catalog loaded once from a data file, indexed and pre-serialized.
+    
+    For languages other than English, translated entries from the file
+    beside the catalog replace the English text; entries without an
+    up-to-date translation are served in English.
+    """
+    def __init__(self, path=TUTORIALS_PATH, language='en'):
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)['tutorials']
+        translations = load_tutorial_translations(language, path) if language != 'en' else {}
+        
+        # Derived from the data files so every worker serves identical bytes and ETags
+        sources = [path] + ([tutorial_translations_path(language, path)] if translations else [])
+        self.language = language
+        self.last_modified = datetime.fromtimestamp(int(max(os.path.getmtime(source) for source in sources)), tz=timezone.utc)
+        self.timestamp = self.last_modified.isoformat()
+        self.tutorials = {}
+        self.by_difficulty = {}
+        stale = []
+        for entry in entries:
+            tutorial = {key: value for key, value in entry.items() if key != 'id'}
+            # English difficulty names filter every language
+            self.by_difficulty.setdefault(tutorial['difficulty'].lower(), []).append(entry['id'])
+            translation = translations.get(entry['id'])
+            if translation is not None and translation.get('source_hash') == tutorial_source_hash(entry):
+                tutorial.update({key: value for key, value in translation.items() if key in tutorial})
+            elif language != 'en':
+                stale.append(entry['id'])
+            self.tutorials[entry['id']] = tutorial
+        if stale:
+            logger.warning(f"Serving English for tutorials without a current {language} translation: {', '.join(stale)}; "
+                           f"run build_tutorial_translations.py")
+        
+        # Pre-serialize each tutorial both as a catalog fragment and as a full response
+        self._fragments = {
+            tutorial_id: json_bytes(tutorial_id) + b':' + json_bytes(tutorial)
+            for tutorial_id, tutorial in self.tutorials.items()
+        }
+        self.tutorial_json = {}
+        for tutorial_id, tutorial in self.tutorials.items():
+            body = json_bytes({"tutorial": tutorial, "tutorial_id": tutorial_id, "language": language, "timestamp": self.timestamp})
+            self.tutorial_json[tutorial_id] = (body, hashlib.sha256(body).hexdigest()[:32])
+        
+        self.catalog_json = self._render(list(self.tutorials))
+        self.etag = hashlib.sha256(self.catalog_json).hexdigest()[:32]
+        self._compressed = {}  # (etag, encoding) -> compressed body
+    
+    def compressed(self, body, etag, encoding):
+        """body compressed with encoding; each pre-serialized body is compressed once, on first request"""
+        data = self._compressed.get((etag, encoding))
+        if data is None:
+            data = brotli.compress(body, quality=11) if encoding == 'br' else gzip.compress(body, compresslevel=9, mtime=0)
+            self._compressed[(etag, encoding)] = data
+        return data
+    
+    def _render(self, tutorial_ids, pagination=None):
+        body = b'{"tutorials":{' + b','.join(self._fragments[tutorial_id] for tutorial_id in tutorial_ids) + b'}'
+        body += b',"total_count":' + json_bytes(len(tutorial_ids) if pagination is None else pagination["total_count"])
+        if pagination is not None:
+            body += b',"page":' + json_bytes(pagination["page"])
+            body += b',"per_page":' + json_bytes(pagination["per_page"])
+            body += b',"total_pages":' + json_bytes(pagination["total_pages"])
+        return body + b',"language":' + json_bytes(self.language) + b',"timestamp":' + json_bytes(self.timestamp) + b'}'
+    
+    def list_json(self, difficulty=None, page=1, per_page=TUTORIALS_PER_PAGE):
+        """Return (body, etag) for a filtered and paginated slice of the catalog"""
+        tutorial_ids = self.by_difficulty.get(difficulty.lower(), []) if difficulty else list(self.tutorials)
+        start = (page - 1) * per_page
+        body = self._render(tutorial_ids[start:start + per_page], {
+            "total_count": len(tutorial_ids),
+            "page": page,
+            "per_page": per_page,
+            "total_pages": -(-len(tutorial_ids) // per_page)
+        })
+        return body, hashlib.sha256(body).hexdigest()[:32]
+
+tutorial_catalogs = {language: TutorialCatalog(language=language) for language in TUTORIAL_LANGUAGES}
+
+class FAQIndex:
+    """TF-IDF retrieval over the FAQ and tutorials, memory-mapped from the prebuilt index"""
+    def __init__(self, index_dir=FAQ_INDEX_DIR):
+        self.index_dir = index_dir
+        self.indptr = None  # Term-major CSR matrix: row t holds indices[indptr[t]:indptr[t + 1]] and the same slice of data
+        self.indices = None
+        self.data = None
+        self.documents = []
+        self.direct_answers = 0
+        self.grounded = 0
+        self.misses = 0
+        self._load_attempted = False
+        self._load_lock = threading.Lock()
+    
+    def ensure_loaded(self):
+        """Load the index once, on first use or from create_app(); a missing index is only logged"""
+        with self._load_lock:
+            if self._load_attempted:
+                return
+            self._load_attempted = True
+            try:
+                self.load()
+            except FileNotFoundError:
+                logger.warning(f"FAQ index not found in {self.index_dir}; run build_faq_index.py to enable FAQ answers")
+    
+    def load(self, sources=None):
+        with open(os.path.join(self.index_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.term_ids = {term: i for i, term in enumerate(meta['vocabulary'])}
+        self.idf = meta['idf']
+        self.unknown_idf = max(self.idf, default=1.0)  # Terms outside the vocabulary count as the rarest
+        self.documents = meta['documents']
+        self.indices = np.load(os.path.join(self.index_dir, 'indices.npy'), mmap_mode='r')
+        self.data = np.load(os.path.join(self.index_dir, 'data.npy'), mmap_mode='r')
+        self.indptr = np.load(os.path.join(self.index_dir, 'indptr.npy'), mmap_mode='r')
+        
+        stale = [path for path in (sources or faq_sources()) if meta['sources'].get(os.path.basename(path)) != file_content_hash(path)]
+        if stale:
+            logger.warning(f"FAQ index is older than {', '.join(stale)}; rebuild it with build_faq_index.py")
+    
+    def search(self, text, limit=FAQ_GROUNDING_SNIPPETS):
+        """Return up to limit (score, document) pairs by cosine similarity, best first"""
+        if self.indptr is None and not self._load_attempted:
+            self.ensure_loaded()
+        if self.indptr is None:
+            return []
+        term_ids = []
+        weights = []
+        unknown_weight = 0.0
+        for term, count in Counter(faq_terms(text)).items():
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                unknown_weight += ((1 + math.log(count)) * self.unknown_idf) ** 2
+            else:
+                term_ids.append(term_id)
+                weights.append((1 + math.log(count)) * self.idf[term_id])
+        if not term_ids:
+            return []
+        
+        # Sum the query terms' rows; each row lists a term's documents once
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        for term_id, weight in zip(term_ids, weights):
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            scores[self.indices[start:end]] += weight * self.data[start:end]
+        scores /= math.sqrt(sum(weight * weight for weight in weights) + unknown_weight)
+        best = np.argsort(scores)[::-1][:limit]
+        return [(float(scores[i]), self.documents[i]) for i in best if scores[i] > 0]
+    
+    def consult(self, text, language, allow_answer=True):
+        """Return (answer, grounding) for a chat message.
+        
+        answer is a curated FAQ answer in the requested language when the
+        match is confident enough to skip Gemini; otherwise grounding holds
+        the snippets worth adding to the prompt (possibly none).
+        """
+        matches = self.search(text, FAQ_GROUNDING_SNIPPETS * 3)
+        if not matches:
+            self.misses += 1
+            return None, ''
+        
+        score, document = matches[0]
+        if allow_answer and score >= FAQ_ANSWER_THRESHOLD and document['kind'] == 'faq' and document['language'] == language:
+            self.direct_answers += 1
+            return document['answer'], ''
+        
+        snippets = []
+        for score, document in matches:
+            if score < FAQ_GROUNDING_THRESHOLD or len(snippets) == FAQ_GROUNDING_SNIPPETS:
+                break
+            if document['snippet'] not in snippets:
+                snippets.append(document['snippet'])
+        if snippets:
+            self.grounded += 1
+        else:
+            self.misses += 1
+        return None, "\n\n".join(snippets)
+    
+    def stats(self):
+        return {
+            "documents": len(self.documents),
+            "direct_answers": self.direct_answers,
+            "grounded": self.grounded,
+            "misses": self.misses
+        }
+
+faq_index = FAQIndex()
+
+def consult_faq(user_message, language, file_context=''):
+    """Look the message up in the FAQ index; questions about an uploaded file always go to Gemini"""
+    with timed_stage('faq_lookup'):
+        return faq_index.consult(user_message, language, allow_answer=not file_context)
+
+def is_retryable(error):
+    """Transient upstream errors worth retrying"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return isinstance(error, (
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted
+    ))
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures, probing again after a cool-down"""
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+    
+    def before_call(self):
+        with self._lock:
+            if self.state == 'closed':
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining <= 0:
+                # Let exactly one probe call through; if its outcome is never recorded,
+                # another probe is allowed after a further reset_timeout
+                self.state = 'half_open'
+                self._opened_at = time.monotonic()
+                return
+            raise CircuitOpenError(max(remaining, 0) or self.reset_timeout)
+    
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+class ResilientModel:
+    """Wrap a Gemini model with deadlines, retries, a circuit breaker and request coalescing.
+    
+    The wrapped client only needs a generate_content(content, stream=..., request_options=...)
+    method, so a local fake model can stand in for Gemini.
+    """
+    def __init__(self, client, timeout=GEMINI_TIMEOUT, max_retries=GEMINI_MAX_RETRIES,
+                 base_delay=GEMINI_RETRY_BASE_DELAY, max_delay=GEMINI_RETRY_MAX_DELAY, breaker=None):
+        self.client = client
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+    
+    def _backoff(self, attempt):
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+    
+    def _with_retries(self, call):
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                result = call()
+            except Exception as e:
+                if not is_retryable(e):
+                    # The upstream answered; a rejected request says nothing about its health
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning(f"Retrying Gemini call after error: {str(e)}")
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+            else:
+                self.breaker.record_success()
+                return result
+    
+    @staticmethod
+    def _coalescing_key(content):
+        digest = hashlib.sha256()
+        for part in (content if isinstance(content, list) else [content]):
+            if isinstance(part, dict) and "data" in part:
+                digest.update(part.get("mime_type", "").encode('utf-8'))
+                digest.update(part["data"])
+            elif isinstance(part, dict):
+                digest.update(json.dumps(part, sort_keys=True).encode('utf-8'))  # File references
+            else:
+                digest.update(str(part).encode('utf-8'))
+            digest.update(b"\x1f")
+        return digest.hexdigest()
+    
+    def generate_content(self, content, stream=False):
+        if stream:
+            return self._stream(content)
+        
+        # Identical requests already in flight share one upstream call
+        key = self._coalescing_key(content)
+        with self._inflight_lock:
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[key] = Future()
+        if not leader:
+            return pending.result()
+        
+        try:
+            result = self._with_retries(lambda: self.client.generate_content(
+                content, request_options={"timeout": self.timeout}
+            ))
+            pending.set_result(result)
+            return result
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+    
+    def _stream(self, content):
+        # Retries are only possible until the first chunk has been received
+        def start():
+            chunks = iter(self.client.generate_content(
+                content, stream=True, request_options={"timeout": self.timeout}
+            ))
+            return chunks, next(chunks, None)
+        
+        chunks, first = self._with_retries(start)
+        if first is None:
+            return
+        yield first
+        try:
+            yield from chunks
+        except Exception as e:
+            if is_retryable(e):
+                self.breaker.record_failure()
+            raise
+
+model = None
+recognizer = None
+_subsystem_lock = threading.Lock()
+
+def get_model():
+    """Return the Gemini model, configuring the client on first use"""
+    global model
+    if model is None:
+        with _subsystem_lock:
+            if model is None:
+                if not GEMINI_API_KEY:
+                    raise ValueError("GEMINI_API_KEY must be set in .env.local file")
+                genai.configure(api_key=GEMINI_API_KEY)
+                # Initialize Gemini model (using Flash as requested). The fixed system context
+                # is sent once as the model's system instruction rather than in every prompt.
+                model = ResilientModel(genai.GenerativeModel(
+                    'gemini-1.5-flash',
+                    system_instruction=get_digital_literacy_context() if PROMPT_SYSTEM_INSTRUCTION else None
+                ))
+    return model
+
+def get_recognizer():
+    """Return the speech recognizer, importing speech_recognition on first use"""
+    global recognizer
+    if recognizer is None:
+        with _subsystem_lock:
+            if recognizer is None:
+                recognizer = sr.Recognizer()
+    return recognizer
+
+def clip_text(text, limit):
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+def summarize_message(msg):
+    """One-line gist of a message for the running conversation summary"""
+    prefix = "User asked" if msg['role'] == 'user' else "Assistant answered"
+    return clip_text(f"{prefix}: {' '.join(msg['content'].split())}", SUMMARY_LINE_CHAR_LIMIT)
+
+def compact_history(history):
+    """Fold turns older than the prompt window into a running summary.
+    
+    Only the messages that fall out of the window on this turn are
+    summarized; the existing summary is extended, not rebuilt.
+    """
+    summary = history[0] if history and history[0]['role'] == 'summary' else None
+    messages = history[1:] if summary else history
+    if len(messages) <= PROMPT_HISTORY_MESSAGES:
+        return history
+    
+    overflow = messages[:-PROMPT_HISTORY_MESSAGES]
+    lines = summary['content'].split("\n") if summary else []
+    lines.extend(summarize_message(msg) for msg in overflow)
+    
+    # Drop the oldest lines once the summary is over its budget
+    while len(lines) > 1 and sum(len(line) + 1 for line in lines) > SUMMARY_CHAR_LIMIT:
+        lines.pop(0)
+    
+    summary = {"role": "summary", "content": "\n".join(lines)}
+    return [summary] + messages[-PROMPT_HISTORY_MESSAGES:]
+
+def build_conversation_context(history, user_message, language='en', file_context='', grounding=''):
+    """Build the prompt sent to Gemini within the PROMPT_CHAR_BUDGET"""
+    with timed_stage('prompt_assembly'):
+        prompt = _build_conversation_context(history, user_message, language, file_context, grounding)
+    prompt_size.observe(len(prompt))
+    return prompt
 
-# Create upload directory if it doesn't exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+def _build_conversation_context(history, user_message, language, file_context, grounding=''):
+    summary = history[0]['content'] if history and history[0]['role'] == 'summary' else ''
+    messages = history[1:] if summary else history
+    budget = PROMPT_CHAR_BUDGET
+    
+    # Add file context and help articles if available, then spend the remaining budget on recent turns
+    file_part = ""
+    if file_context:
+        file_part = f"\nFile Context: {clip_text(file_context, budget // 2)}\n"
+        budget -= len(file_part)
+    if grounding:
+        grounding_part = f"\nRelevant Help Articles (use them if they answer the question):\n{clip_text(grounding, budget // 2)}\n"
+        file_part += grounding_part
+        budget -= len(grounding_part)
+    
+    history_lines = []
+    older_lines = []
+    for msg in reversed(messages[-PROMPT_HISTORY_MESSAGES:]):
+        line = f"{msg['role'].capitalize()}: {clip_text(msg['content'], PROMPT_MESSAGE_CHAR_LIMIT)}\n"
+        if len(line) <= budget:
+            history_lines.append(line)
+            budget -= len(line)
+        else:
+            # Out of budget: keep just the gist of the remaining older turns
+            older_lines.append(summarize_message(msg))
+    history_lines.reverse()
+    older_lines.reverse()
+    
+    summary_lines = [line for line in summary.split("\n") if line] + older_lines
+    summary_text = clip_text("\n".join(summary_lines), max(budget, 0)) if summary_lines else ""
+    
+    parts = []
+    if not PROMPT_SYSTEM_INSTRUCTION:
+        parts.append(get_digital_literacy_context())
+    if summary_text:
+        parts.append(f"\n\nSummary of Earlier Conversation:\n{summary_text}\n")
+    parts.append("\n\nConversation History:\n")
+    parts.extend(history_lines)
+    parts.append(file_part)
+    
+    # Add language preference
+    if language == 'hi':
+        parts.append("\nPlease respond in Hindi (Devanagari script) when appropriate, but you can use English for technical terms if needed.")
+    
+    parts.append(f"\nCurrent User Message: {clip_text(user_message, PROMPT_MESSAGE_CHAR_LIMIT)}\n")
+    return "".join(parts)
 
-# In-memory storage for feedback (in production, use a database)
-feedback_storage = []
-chat_history = {}
+class FeedbackStore:
+    """Persistent feedback storage in SQLite with indexed filters"""
+    columns = ('id', 'name', 'email', 'category', 'rating', 'message', 'timestamp', 'status')
+    schema = (
+        "CREATE TABLE IF NOT EXISTS feedback ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, email TEXT NOT NULL, "
+        "category TEXT NOT NULL, rating INTEGER NOT NULL DEFAULT 0, message TEXT NOT NULL, "
+        "timestamp TEXT NOT NULL, status TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_feedback_category ON feedback (category, id)",
+        "CREATE INDEX IF NOT EXISTS idx_feedback_rating ON feedback (rating, id)",
+        "CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback (timestamp)"
+    )
+    
+    def __init__(self, path=FEEDBACK_DB_PATH):
+        # Full sync: feedback is kept indefinitely, unlike sessions and rate limits
+        self._connections = SQLiteConnections(path, self.schema, synchronous='FULL')
+    
+    def _connect(self):
+        return self._connections.get()
+    
+    def add(self, feedback):
+        """Insert feedback and return its id, assigned atomically by SQLite"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO feedback (name, email, category, rating, message, timestamp, status) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (feedback['name'], feedback['email'], feedback['category'], feedback['rating'],
+                 feedback['message'], feedback['timestamp'], feedback['status'])
+            )
+            return cursor.lastrowid
+    
+    def _where(self, category=None, min_rating=None, max_rating=None, since=None, until=None):
+        clauses, params = [], []
+        if category:
+            clauses.append("category = ?")
+            params.append(category)
+        if min_rating is not None:
+            clauses.append("rating >= ?")
+            params.append(min_rating)
+        if max_rating is not None:
+            clauses.append("rating <= ?")
+            params.append(max_rating)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp <= ?")
+            params.append(until)
+        return clauses, params
+    
+    def ping(self):
+        self._connect().execute("SELECT 1")
+    
+    def list(self, cursor=None, limit=FEEDBACK_PAGE_SIZE, **filters):
+        """Return (items, next_cursor) newest first; pass next_cursor back for the next page"""
+        clauses, params = self._where(**filters)
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(cursor)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT {', '.join(self.columns)} FROM feedback {where} ORDER BY id DESC LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+        items = [dict(zip(self.columns, row)) for row in rows[:limit]]
+        next_cursor = items[-1]['id'] if len(rows) > limit else None
+        return items, next_cursor
+    
+    def aggregates(self, **filters):
+        """Counts and average rating for the filtered feedback, computed in SQLite"""
+        clauses, params = self._where(**filters)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        conn = self._connect()
+        total_count, average_rating = conn.execute(
+            f"SELECT COUNT(*), AVG(rating) FROM feedback {where}", params
+        ).fetchone()
+        by_category = dict(conn.execute(
+            f"SELECT category, COUNT(*) FROM feedback {where} GROUP BY category", params
+        ).fetchall())
+        by_rating = {str(rating): count for rating, count in conn.execute(
+            f"SELECT rating, COUNT(*) FROM feedback {where} GROUP BY rating", params
+        ).fetchall()}
+        return {
+            "total_count": total_count,
+            "average_rating": round(average_rating, 2) if average_rating is not None else None,
+            "by_category": by_category,
+            "by_rating": by_rating
+        }
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+feedback_store = FeedbackStore()
 
-def extract_text_from_pdf(filepath):
-    """Extract text from PDF file"""
-    try:
-        with open(filepath, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            return text[:2000]  # Limit to first 2000 characters
-    except Exception as e:
-        logger.error(f"Error extracting PDF text: {str(e)}")
-        return "Could not extract text from PDF"
+def sse_event(data, event=None):
+    """Format a payload as a Server-Sent Events message"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-def process_image_file(filepath):
-    """Process image file for Gemini"""
-    try:
-        with open(filepath, 'rb') as img_file:
-            img_data = img_file.read()
-            img_base64 = base64.b64encode(img_data).decode('utf-8')
-            return {
-                "mime_type": f"image/{filepath.split('.')[-1].lower()}",
-                "data": img_base64
-            }
-    except Exception as e:
-        logger.error(f"Error processing image: {str(e)}")
-        return None
+def accepted_encoding(encodings):
+    """First of encodings the client accepts, or None for identity"""
+    return next((encoding for encoding in encodings if request.accept_encodings[encoding]), None)
 
-def get_digital_literacy_context():
-    """Return context-specific information for digital literacy assistance"""
-    return """
-    You are TechBuddy, a helpful AI assistant specialized in digital literacy for parents and elderly users.
-    Your role is to help users learn essential digital skills in a simple, patient, and encouraging manner.
+class StaticAssets:
+    """Manifest of the frontend build with precompressed variants and a cache policy per file"""
+    def __init__(self, root):
+        self.root = root
+        self.files = {}  # path relative to root -> entry
     
-    Key areas you help with:
-    - WhatsApp: messaging, calls, sharing photos, video calls, group chats
-    - Paytm & Digital Payments: account setup, money transfer, bill payments, security
-    - Google Maps: navigation, finding places, getting directions, saving locations
-    - Email & Gmail: account setup, sending/receiving emails, attachments, organization
-    - Social Media Safety: privacy settings, recognizing scams, safe sharing
-    - Online Shopping: trusted sites, secure payments, reading reviews, order tracking
+    @staticmethod
+    def encoders():
+        if brotli is not None:
+            yield 'br', '.br', lambda data: brotli.compress(data, quality=11)
+        yield 'gzip', '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)
     
-    Guidelines for responses:
-    - Use simple, clear language
-    - Break down complex tasks into step-by-step instructions
-    - Be patient and encouraging
-    - Provide safety tips when relevant
-    - Ask follow-up questions to better understand user needs
-    - Use examples relevant to Indian context when applicable
-    - Support both English and Hindi languages
-    - If user sends an image, analyze it and provide relevant guidance
-    - If user sends a document, read it and help with digital literacy questions related to it
+    def load(self, precompress=STATIC_PRECOMPRESS):
+        files = {}
+        if os.path.isdir(self.root):
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    stem, extension = os.path.splitext(path)
+                    if extension in ('.br', '.gz', '.tmp') and os.path.exists(stem):
+                        continue  # A variant of another file
+                    relative_path = os.path.relpath(path, self.root).replace(os.sep, '/')
+                    files[relative_path] = self._describe(path, relative_path, precompress)
+        self.files = files
     
-    Always be supportive and remember that learning technology can be intimidating for some users.
-    """
+    def _describe(self, path, relative_path, precompress):
+        with open(path, 'rb') as f:
+            data = f.read()
+        modified = os.path.getmtime(path)
+        if relative_path == 'index.html':
+            cache_control = 'no-cache'  # Always revalidated so new builds are picked up
+        elif STATIC_HASHED_PATTERN.match(relative_path):
+            cache_control = f'public, max-age={STATIC_IMMUTABLE_MAX_AGE}, immutable'
+        else:
+            cache_control = f'public, max-age={STATIC_MAX_AGE}'
+        entry = {
+            "path": path,
+            "etag": hashlib.sha256(data).hexdigest()[:32],
+            "last_modified": modified,
+            "mimetype": mimetypes.guess_type(path)[0] or 'application/octet-stream',
+            "cache_control": cache_control,
+            "variants": {}  # encoding -> path, in order of preference
+        }
+        if os.path.splitext(path)[1] not in COMPRESSIBLE_EXTENSIONS or len(data) < COMPRESS_MIN_BYTES:
+            return entry
+        
+        for encoding, suffix, compress in self.encoders():
+            variant = path + suffix
+            fresh = os.path.exists(variant) and os.path.getmtime(variant) >= modified
+            if precompress and not fresh:
+                try:
+                    with open(variant + '.tmp', 'wb') as f:
+                        f.write(compress(data))
+                    os.replace(variant + '.tmp', variant)
+                    fresh = True
+                except OSError as e:
+                    logger.warning(f"Could not precompress {relative_path}: {str(e)}")
+            if fresh and os.path.getsize(variant) < len(data):
+                entry["variants"][encoding] = variant
+        return entry
+    
+    def response(self, filename):
+        entry = self.files.get(filename)
+        if entry is None:
+            # Not in the manifest (e.g. added after startup): plain static file handling
+            return app.send_static_file(filename)
+        
+        encoding = accepted_encoding(entry["variants"])
+        response = send_file(
+            entry["variants"][encoding] if encoding else entry["path"],
+            mimetype=entry["mimetype"],
+            etag=f'{entry["etag"]}-{encoding}' if encoding else entry["etag"],
+            last_modified=entry["last_modified"],
+            conditional=True
+        )
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if entry["variants"]:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = entry["cache_control"]
+        return response
+
+static_assets = StaticAssets(app.static_folder)
+app.view_functions['static'] = static_assets.response
+
+@app.after_request
+def compress_json_response(response):
+    """Compress JSON API responses above COMPRESS_MIN_BYTES when the client accepts it"""
+    # Responses that already vary on Accept-Encoding chose their encoding themselves (see cached_json_response)
+    if (response.mimetype != 'application/json' or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or 'Accept-Encoding' in response.vary):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    encoding = accepted_encoding(COMPRESS_ENCODINGS)
+    if len(data) < COMPRESS_MIN_BYTES or encoding is None:
+        return response
+    
+    response.set_data(brotli.compress(data, quality=5) if encoding == 'br' else gzip.compress(data, compresslevel=COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = encoding
+    # Compressed bytes differ, so the validator becomes weak; If-None-Match still matches it
+    etag, _ = response.get_etag()
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
 
 @app.route('/')
 def home():
     """Serve the main HTML page"""
-    return send_from_directory(app.static_folder, 'index.html')
+    return static_assets.response('index.html')
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
@@ -131,41 +2327,31 @@ def chat():
         language = data.get('language', 'en')
         file_context = data.get('file_context', '')
         
-        # Initialize chat history for session if not exists
-        if session_id not in chat_history:
-            chat_history[session_id] = []
-        
-        # Add user message to history
-        chat_history[session_id].append({"role": "user", "content": user_message})
-        
-        # Prepare context and conversation history
-        context = get_digital_literacy_context()
-        
-        # Build conversation context
-        conversation_context = context + "\n\nConversation History:\n"
-        for msg in chat_history[session_id][-10:]:  # Last 10 messages for context
-            conversation_context += f"{msg['role'].capitalize()}: {msg['content']}\n"
-        
-        # Add file context if available
-        if file_context:
-            conversation_context += f"\nFile Context: {file_context}\n"
-        
-        # Add language preference
-        if language == 'hi':
-            conversation_context += "\nPlease respond in Hindi (Devanagari script) when appropriate, but you can use English for technical terms if needed."
-        
-        conversation_context += f"\nCurrent User Message: {user_message}\n"
+        # Load chat history for session and add user message
+        history = session_store.get(session_id)
+        history.append({"role": "user", "content": user_message})
         
-        # Generate response using Gemini
-        response = model.generate_content(conversation_context)
-        bot_response = response.text
+        # Answer common questions from the FAQ index, then repeated opening questions from the response cache
+        bot_response, grounding = consult_faq(user_message, language, file_context)
+        cache_key = response_cache_key(history, user_message, language, file_context)
+        if bot_response is None and cache_key:
+            bot_response = response_cache.get(cache_key)
         
-        # Add bot response to history
-        chat_history[session_id].append({"role": "assistant", "content": bot_response})
+        if bot_response is None:
+            # Build conversation context
+            conversation_context = build_conversation_context(history, user_message, language, file_context, grounding)
+            
+            # Generate response using Gemini
+            response = generate_content(conversation_context)
+            bot_response = response.text
+            response_size.observe(len(bot_response))
+            
+            if cache_key:
+                response_cache.set(cache_key, bot_response)
         
-        # Keep only last 20 messages to manage memory
-        if len(chat_history[session_id]) > 20:
-            chat_history[session_id] = chat_history[session_id][-20:]
+        # Add bot response to history (the store keeps only the last 20 messages)
+        history.append({"role": "assistant", "content": bot_response})
+        session_store.save(session_id, compact_history(history))
         
         return jsonify({
             "response": bot_response,
@@ -173,10 +2359,566 @@ def chat():
             "timestamp": datetime.now().isoformat()
         })
         
+    except UpstreamUnavailableError as e:
+        return upstream_busy_response(e)
     except Exception as e:
         logger.error(f"Chat error: {str(e)}")
         return jsonify({"error": "Failed to process chat message. Please try again."}), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream chat responses from Gemini as Server-Sent Events"""
+    data = request.get_json(silent=True)
+    
+    if not data or 'message' not in data:
+        return jsonify({"error": "Message is required"}), 400
+    
+    user_message = data['message']
+    session_id = data.get('session_id', 'default')
+    language = data.get('language', 'en')
+    file_context = data.get('file_context', '')
+    
+    # History is only updated once the full answer has been received
+    history = session_store.get(session_id)
+    history.append({"role": "user", "content": user_message})
+    faq_answer, grounding = consult_faq(user_message, language, file_context)
+    cache_key = response_cache_key(history, user_message, language, file_context)
+    
+    def stream_model_response():
+        # Built only for turns that reach Gemini, so FAQ and cache answers stay out of the prompt metrics
+        conversation_context = build_conversation_context(history, user_message, language, file_context, grounding)
+        with upstream_limiter, timed_stage('gemini_call'):
+            for chunk in get_model().generate_content(conversation_context, stream=True):
+                if chunk.text:
+                    yield chunk.text
+    
+    def generate():
+        # Serve FAQ answers and repeated opening questions without calling Gemini
+        cached_response = faq_answer
+        if cached_response is None and cache_key:
+            cached_response = response_cache.get(cache_key)
+        chunks = []
+        try:
+            for text in ([cached_response] if cached_response is not None else stream_model_response()):
+                chunks.append(text)
+                yield sse_event({"chunk": text})
+        except UpstreamUnavailableError:
+            yield sse_event({"error": "The assistant is busy right now. Please try again in a moment."}, event="error")
+            return
+        except Exception as e:
+            logger.error(f"Chat stream error: {str(e)}")
+            yield sse_event({"error": "Failed to process chat message. Please try again."}, event="error")
+            return
+        
+        bot_response = "".join(chunks)
+        if cache_key and cached_response is None:
+            response_cache.set(cache_key, bot_response)
+        if cached_response is None:
+            response_size.observe(len(bot_response))
+        
+        # Add the exchange to history now that the stream has completed
+        history.append({"role": "assistant", "content": bot_response})
+        session_store.save(session_id, compact_history(history))
+        
+        yield sse_event({
+            "response": bot_response,
+            "session_id": session_id,
+            "timestamp": datetime.now().isoformat()
+        }, event="done")
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def answer_question(message, language, admit=None):
+    """Answer a standalone question with the chat prompt logic; returns (answer, source).
+    
+    admit, if given, is called just before the question goes to Gemini and
+    may block; FAQ and cached answers never reach it.
+    """
+    answer, grounding = consult_faq(message, language)
+    if answer is not None:
+        return answer, "faq"
+    
+    history = [{"role": "user", "content": message}]
+    cache_key = response_cache_key(history, message, language)
+    cached_response = response_cache.get(cache_key) if cache_key else None
+    if cached_response is not None:
+        return cached_response, "cache"
+    
+    if admit:
+        admit()
+    
+    # Identical questions already in flight share one Gemini call (see ResilientModel)
+    conversation_context = build_conversation_context(history, message, language, grounding=grounding)
+    answer = generate_content(conversation_context).text
+    response_size.observe(len(answer))
+    if cache_key:
+        response_cache.set(cache_key, answer)
+    return answer, "model"
+
+def answer_batch_item(item, default_language, admit=None):
+    if isinstance(item, str):
+        item = {"message": item}
+    if not isinstance(item, dict) or not isinstance(item.get('message'), str) or not item['message'].strip():
+        raise ValueError("Message is required")
+    return answer_question(item['message'], item.get('language') or default_language, admit)
+
+def batch_result(index, item, future):
+    """Collect one batch result; failures are reported on the item instead of aborting the batch"""
+    result = {"index": index}
+    if isinstance(item, dict) and 'id' in item:
+        result["id"] = item['id']
+    try:
+        result["response"], result["source"] = future.result()
+    except ValueError as e:
+        result["error"] = str(e)
+    except UpstreamUnavailableError:
+        result["error"] = "The assistant is busy right now. Please try again in a moment."
+    except Exception as e:
+        logger.error(f"Batch chat error: {str(e)}")
+        result["error"] = "Failed to process chat message. Please try again."
+    return result
+
+def ndjson_line(data):
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+def batch_results(questions, default_language, admit=None):
+    """Answer questions with bounded parallelism, yielding results in input order"""
+    executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix='chat-batch')
+    try:
+        # Keep a small window of questions in flight so memory stays flat for large batches
+        pending = deque()
+        for index, item in enumerate(questions):
+            pending.append((index, item, executor.submit(answer_batch_item, item, default_language, admit)))
+            if len(pending) >= BATCH_CONCURRENCY * 2:
+                yield batch_result(*pending.popleft())
+        while pending:
+            yield batch_result(*pending.popleft())
+    finally:
+        # Stop answering if the client goes away
+        executor.shutdown(wait=False, cancel_futures=True)
+
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    """Answer a list of standalone questions, streaming one NDJSON line per question in input order"""
+    data = request.get_json(silent=True)
+    questions = data.get('questions') if isinstance(data, dict) else None
+    
+    if not isinstance(questions, list) or not questions:
+        return jsonify({"error": "A non-empty list of questions is required"}), 400
+    if len(questions) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {BATCH_MAX_ITEMS} questions are allowed per batch"}), 400
+    
+    default_language = data.get('language', 'en')
+    ip = client_ip()
+    session_id = rate_limit_session_id()
+    cancelled = threading.Event()
+    
+    def admit():
+        # Each question that needs Gemini costs what it would via /api/chat; the batch is paced
+        # by the caller's buckets rather than refused when it is larger than a burst
+        retry_after = take_rate_limit_tokens(RATE_LIMIT_BATCH_ITEM_COST, ip, lambda: session_id)
+        while retry_after:
+            if cancelled.wait(retry_after):
+                raise UpstreamBusyError()
+            retry_after = take_rate_limit_tokens(RATE_LIMIT_BATCH_ITEM_COST, ip, lambda: session_id)
+    
+    def generate():
+        failed = 0
+        results = batch_results(questions, default_language, admit)
+        try:
+            for result in results:
+                failed += "error" in result
+                yield ndjson_line(result)
+        finally:
+            # Release questions still waiting for tokens if the client goes away
+            cancelled.set()
+            results.close()
+        
+        yield ndjson_line({
+            "done": True,
+            "total": len(questions),
+            "failed": failed,
+            "timestamp": datetime.now().isoformat()
+        })
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+class AudioDecodeError(Exception):
+    """Raised when an audio clip cannot be decoded"""
+
+class SpeechEngineUnavailableError(Exception):
+    """Raised when a speech engine's optional dependency or model is missing"""
+
+def decode_audio(data, file_extension):
+    """Decode an audio clip in memory to 16 kHz mono 16-bit PCM"""
+    if file_extension in ('wav', 'aiff', 'aif', 'flac'):
+        try:
+            with sr.AudioFile(io.BytesIO(data)) as source:
+                audio = get_recognizer().record(source)  # Down-mixed to mono by AudioFile
+            return sr.AudioData(audio.get_raw_data(convert_rate=SPEECH_SAMPLE_RATE, convert_width=2), SPEECH_SAMPLE_RATE, 2)
+        except ValueError:
+            pass  # Mislabelled container; let ffmpeg sniff it
+    
+    # Compressed browser formats (webm, ogg, m4a, mp3) are decoded by ffmpeg over pipes
+    if shutil.which(FFMPEG_BINARY) is None:
+        raise AudioDecodeError(f"Decoding .{file_extension} audio requires ffmpeg")
+    try:
+        result = subprocess.run(
+            [FFMPEG_BINARY, '-nostdin', '-loglevel', 'error', '-i', 'pipe:0',
+             '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', '1', '-ar', str(SPEECH_SAMPLE_RATE), 'pipe:1'],
+            input=data, capture_output=True, timeout=AUDIO_DECODE_TIMEOUT, check=True
+        )
+    except subprocess.CalledProcessError as e:
+        raise AudioDecodeError(e.stderr.decode('utf-8', 'replace').strip() or "ffmpeg could not decode audio")
+    except subprocess.TimeoutExpired:
+        raise AudioDecodeError("Audio decoding timed out")
+    if not result.stdout:
+        raise AudioDecodeError("Audio clip is empty")
+    return sr.AudioData(result.stdout, SPEECH_SAMPLE_RATE, 2)
+
+def recognition_language(language):
+    return 'hi-IN' if language in ('hi', 'hi-IN') else 'en-US'
+
+class GoogleSpeechEngine:
+    """Google Web Speech API (network round trip)"""
+    name = 'google'
+    
+    def transcribe(self, audio, language):
+        return get_recognizer().recognize_google(audio, language=recognition_language(language))
+
+class VoskSpeechEngine:
+    """Offline recognition with Vosk models loaded from VOSK_MODEL_DIR/<language>"""
+    name = 'vosk'
+    
+    def __init__(self, model_dir=VOSK_MODEL_DIR):
+        self.model_dir = model_dir
+        self._models = {}
+        self._lock = threading.Lock()
+    
+    def _model(self, language):
+        with self._lock:
+            if language not in self._models:
+                try:
+                    import vosk  # Optional dependency, only needed for this engine
+                except ImportError:
+                    raise SpeechEngineUnavailableError("The vosk package is not installed")
+                path = os.path.join(self.model_dir, language)
+                if not os.path.isdir(path):
+                    raise SpeechEngineUnavailableError(f"No Vosk model found at {path}")
+                self._models[language] = vosk.Model(path)
+            return self._models[language]
+    
+    def transcribe(self, audio, language):
+        model = self._model(recognition_language(language))
+        import vosk
+        vosk_recognizer = vosk.KaldiRecognizer(model, SPEECH_SAMPLE_RATE)
+        vosk_recognizer.AcceptWaveform(audio.get_raw_data())
+        text = json.loads(vosk_recognizer.FinalResult()).get('text', '')
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+class WhisperSpeechEngine:
+    """Offline recognition with a local faster-whisper model, loaded once"""
+    name = 'whisper'
+    
+    def __init__(self, model_name=WHISPER_MODEL):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+    
+    def transcribe(self, audio, language):
+        with self._lock:
+            if self._model is None:
+                try:
+                    from faster_whisper import WhisperModel  # Optional dependency
+                except ImportError:
+                    raise SpeechEngineUnavailableError("The faster-whisper package is not installed")
+                self._model = WhisperModel(self.model_name)
+        import numpy as np
+        samples = np.frombuffer(audio.get_raw_data(), dtype=np.int16).astype(np.float32) / 32768.0
+        segments, _ = self._model.transcribe(samples, language=recognition_language(language)[:2])
+        text = " ".join(segment.text.strip() for segment in segments).strip()
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+speech_engines = {engine.name: engine for engine in (GoogleSpeechEngine(), VoskSpeechEngine(), WhisperSpeechEngine())}
+
+def recognize_audio(data, file_extension, language, engine):
+    """Decode an audio clip and transcribe it with the chosen engine"""
+    with timed_stage('audio_decode'):
+        audio = decode_audio(data, file_extension)
+    with timed_stage('speech_recognition'):
+        return speech_engines[engine].transcribe(audio, language)
+
+class VoiceStream:
+    """Incremental transcription of a clip that is still being recorded.
+    
+    Raw PCM frames are segmented with an energy-based voice activity
+    detector; each closed segment is transcribed in the background while
+    the user keeps speaking.
+    """
+    frame_bytes = SPEECH_SAMPLE_RATE * 2 * VAD_FRAME_MS // 1000
+    
+    def __init__(self, language, engine, admit_segment=lambda: 0):
+        self.stream_id = uuid.uuid4().hex
+        self.language = language
+        self.engine = engine
+        self.admit_segment = admit_segment  # Returns 0 to transcribe a closed segment, else seconds to wait
+        self.last_activity = time.monotonic()
+        self.ended = False
+        self._pending = bytearray()
+        self._preroll = []
+        self._segment = None  # bytearray while speech is in progress
+        self._segment_start_ms = 0
+        self._silence_ms = 0
+        self._position_ms = 0
+        self._segments = []  # Futures in segment order
+        self._update = threading.Condition()
+        self._version = 0  # Bumped under _update on every change, so a waiter cannot miss one
+        self._lock = threading.RLock()  # Frames for one stream may arrive on several request threads
+    
+    def feed(self, pcm):
+        """Process audio frames; return 0, or seconds to wait if a segment was refused by admit_segment"""
+        with self._lock:
+            self.last_activity = time.monotonic()
+            self._pending += pcm
+            usable = len(self._pending) - len(self._pending) % self.frame_bytes
+            refused = 0
+            for offset in range(0, usable, self.frame_bytes):
+                refused = max(refused, self._process_frame(bytes(self._pending[offset:offset + self.frame_bytes])))
+            del self._pending[:usable]
+            return refused
+    
+    def accepts(self, byte_count):
+        """Whether byte_count more bytes of audio fit within VOICE_STREAM_MAX_SECONDS"""
+        with self._lock:
+            total_bytes = self._position_ms * self.frame_bytes // VAD_FRAME_MS + len(self._pending) + byte_count
+        return total_bytes <= VOICE_STREAM_MAX_SECONDS * SPEECH_SAMPLE_RATE * 2
+    
+    def _process_frame(self, frame):
+        is_speech = audioop.rms(frame, 2) >= VAD_ENERGY_THRESHOLD
+        self._position_ms += VAD_FRAME_MS
+        
+        if self._segment is None:
+            self._preroll.append(frame)
+            if len(self._preroll) > VAD_PREROLL_MS // VAD_FRAME_MS:
+                self._preroll.pop(0)
+            if is_speech:
+                self._segment = bytearray(b''.join(self._preroll))
+                self._segment_start_ms = self._position_ms - len(self._preroll) * VAD_FRAME_MS
+                self._preroll = []
+                self._silence_ms = 0
+            return 0
+        
+        self._segment += frame
+        self._silence_ms = 0 if is_speech else self._silence_ms + VAD_FRAME_MS
+        if self._silence_ms >= VAD_SILENCE_MS or self._position_ms - self._segment_start_ms >= VOICE_MAX_SEGMENT_MS:
+            return self._close_segment()
+        return 0
+    
+    def _close_segment(self):
+        segment = {"index": len(self._segments), "start_ms": self._segment_start_ms, "end_ms": self._position_ms}
+        # Every transcribed segment is an upstream call, so each one is paid for separately
+        retry_after = self.admit_segment()
+        if retry_after:
+            future = Future()
+            future.set_result(dict(segment, text="", error="Too many requests; this part of the audio was not transcribed"))
+        else:
+            future = voice_stream_executor.submit(self._transcribe, bytes(self._segment), segment)
+        future.add_done_callback(lambda _: self._notify())
+        self._segments.append(future)
+        self._segment = None
+        return retry_after
+    
+    def _transcribe(self, pcm, segment):
+        try:
+            with upstream_limiter, timed_stage('speech_recognition'):
+                segment["text"] = speech_engines[self.engine].transcribe(sr.AudioData(pcm, SPEECH_SAMPLE_RATE, 2), self.language)
+        except sr.UnknownValueError:
+            segment["text"] = ""
+        except Exception as e:
+            logger.error(f"Voice stream segment error: {str(e)}")
+            segment["text"] = ""
+            segment["error"] = "Could not transcribe this part of the audio"
+        return segment
+    
+    def _notify(self):
+        with self._update:
+            self._version += 1
+            self._update.notify_all()
+    
+    def finish(self):
+        """Flush the segment in progress; no more frames are accepted. Returns as feed() does"""
+        with self._lock:
+            refused = self.feed(b'\0' * (-len(self._pending) % self.frame_bytes))
+            if self._segment is not None:
+                refused = max(refused, self._close_segment())
+            self.ended = True
+        self._notify()
+        return refused
+    
+    def completed_segments(self):
+        """Transcribed segments, in order, up to the first one still pending"""
+        completed = []
+        for future in list(self._segments):
+            if not future.done():
+                break
+            completed.append(future.result())
+        return completed
+    
+    @property
+    def done(self):
+        return self.ended and all(future.done() for future in self._segments)
+    
+    @property
+    def version(self):
+        return self._version
+    
+    def wait_for_update(self, seen_version, timeout):
+        """Wait until the stream has changed since seen_version was read"""
+        with self._update:
+            return self._update.wait_for(lambda: self._version != seen_version, timeout)
+    
+    def wait_until_done(self, timeout):
+        with self._update:
+            return self._update.wait_for(lambda: self.done, timeout)
+    
+    def summary(self):
+        segments = self.completed_segments()
+        return {
+            "stream_id": self.stream_id,
+            "segments": segments,
+            "partial_transcript": " ".join(segment["text"] for segment in segments if segment["text"]),
+            "done": self.done
+        }
+
+voice_stream_executor = ThreadPoolExecutor(max_workers=VOICE_STREAM_WORKERS, thread_name_prefix='voice-stream')
+voice_streams = {}
+voice_streams_lock = threading.Lock()
+
+def get_voice_stream(stream_id):
+    """Look up a live stream, dropping streams that have been idle past VOICE_STREAM_TTL"""
+    now = time.monotonic()
+    with voice_streams_lock:
+        for expired_id in [sid for sid, stream in voice_streams.items() if now - stream.last_activity > VOICE_STREAM_TTL]:
+            del voice_streams[expired_id]
+        return voice_streams.get(stream_id)
+
+@app.route('/api/voice-stream', methods=['POST'])
+def start_voice_stream():
+    """Start a streaming transcription; audio is then posted as raw 16 kHz mono s16le frames"""
+    if WEB_WORKERS > 1:
+        # Later requests for the stream may reach another process, which does not know it
+        return jsonify({"error": "Streaming recognition needs a single server process. Use /api/voice-to-text instead."}), 503
+    
+    data = request.get_json(silent=True) or {}
+    engine = data.get('engine', SPEECH_ENGINE)
+    if engine not in speech_engines:
+        return jsonify({"error": f"Unknown speech engine. Supported engines: {', '.join(speech_engines)}"}), 400
+    
+    ip = client_ip()
+    session_id = rate_limit_session_id()
+    stream = VoiceStream(data.get('language', 'en-US'), engine,
+                         admit_segment=lambda: take_rate_limit_tokens(RATE_LIMIT_VOICE_SEGMENT_COST, ip, lambda: session_id))
+    get_voice_stream(None)  # Expire idle streams
+    with voice_streams_lock:
+        voice_streams[stream.stream_id] = stream
+    
+    return jsonify({
+        "stream_id": stream.stream_id,
+        "sample_rate": SPEECH_SAMPLE_RATE,
+        "encoding": "s16le",
+        "channels": 1,
+        "timestamp": datetime.now().isoformat()
+    })
+
+@app.route('/api/voice-stream/<stream_id>/audio', methods=['POST'])
+def voice_stream_audio(stream_id):
+    """Append audio frames and return the transcript so far"""
+    stream = get_voice_stream(stream_id)
+    if stream is None:
+        return jsonify({"error": "Voice stream not found or expired"}), 404
+    if stream.ended:
+        return jsonify({"error": "Voice stream has already ended"}), 409
+    
+    # Measure the body itself: a chunked upload has no Content-Length
+    audio = request.get_data()
+    if not stream.accepts(len(audio)):
+        return jsonify({"error": f"Voice stream is limited to {VOICE_STREAM_MAX_SECONDS} seconds of audio"}), 413
+    
+    retry_after = stream.feed(audio)
+    if retry_after:
+        logger.warning(f"Rate limited voice stream segment from {client_ip()}")
+        return rate_limited_response(retry_after, stream.summary())
+    return jsonify(stream.summary())
+
+@app.route('/api/voice-stream/<stream_id>/events', methods=['GET'])
+def voice_stream_events(stream_id):
+    """Push transcribed segments as Server-Sent Events while audio is still arriving"""
+    stream = get_voice_stream(stream_id)
+    if stream is None:
+        return jsonify({"error": "Voice stream not found or expired"}), 404
+    
+    def generate():
+        sent = 0
+        while True:
+            version = stream.version  # Read before checking, so an update in between ends the wait at once
+            segments = stream.completed_segments()
+            for segment in segments[sent:]:
+                yield sse_event(segment, event="segment")
+            sent = len(segments)
+            if stream.done:
+                yield sse_event(stream.summary(), event="done")
+                return
+            if time.monotonic() - stream.last_activity > VOICE_STREAM_TTL:
+                yield sse_event({"error": "Voice stream expired"}, event="error")
+                return
+            stream.wait_for_update(version, timeout=15)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/api/voice-stream/<stream_id>/end', methods=['POST'])
+def end_voice_stream(stream_id):
+    """Finish the stream and return the full transcript"""
+    stream = get_voice_stream(stream_id)
+    if stream is None:
+        return jsonify({"error": "Voice stream not found or expired"}), 404
+    
+    audio = request.get_data()
+    if not stream.accepts(len(audio)):
+        return jsonify({"error": f"Voice stream is limited to {VOICE_STREAM_MAX_SECONDS} seconds of audio"}), 413
+    
+    # Segments refused by the rate limiter are reported in the transcript with an error
+    if audio:
+        stream.feed(audio)
+    stream.finish()
+    
+    stream.wait_until_done(timeout=UPSTREAM_QUEUE_TIMEOUT)
+    
+    with voice_streams_lock:
+        voice_streams.pop(stream_id, None)
+    
+    result = stream.summary()
+    result["text"] = result.pop("partial_transcript")
+    result["language"] = stream.language
+    result["engine"] = stream.engine
+    result["timestamp"] = datetime.now().isoformat()
+    return jsonify(result)
+
 @app.route('/api/voice-to-text', methods=['POST'])
 def voice_to_text():
     """Convert uploaded voice file to text"""
@@ -190,49 +2932,231 @@ def voice_to_text():
         if audio_file.filename == '':
             return jsonify({"error": "No file selected"}), 400
         
-        # Save the uploaded file temporarily
+        engine = request.form.get('engine', SPEECH_ENGINE)
+        if engine not in speech_engines:
+            return jsonify({"error": f"Unknown speech engine. Supported engines: {', '.join(speech_engines)}"}), 400
+        
+        # Decode the clip in memory; nothing is written to a temporary file
         file_extension = audio_file.filename.rsplit('.', 1)[1].lower() if '.' in audio_file.filename else 'wav'
+        audio_bytes = audio_file.read()
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_extension}') as temp_file:
-            audio_file.save(temp_file.name)
+        try:
+            # Convert speech to text
+            with upstream_limiter:
+                text = recognize_audio(audio_bytes, file_extension, language, engine)
             
-            try:
-                # Convert speech to text
-                with sr.AudioFile(temp_file.name) as source:
-                    # Adjust for ambient noise
-                    recognizer.adjust_for_ambient_noise(source, duration=0.5)
-                    audio_data = recognizer.record(source)
-                    
-                # Set language for recognition
-                if language == 'hi':
-                    text = recognizer.recognize_google(audio_data, language='hi-IN')
-                else:
-                    text = recognizer.recognize_google(audio_data, language='en-US')
-                
-                # Clean up temporary file
-                os.unlink(temp_file.name)
-                
-                return jsonify({
-                    "text": text,
-                    "language": language,
-                    "timestamp": datetime.now().isoformat()
-                })
-                
-            except sr.UnknownValueError:
-                os.unlink(temp_file.name)
-                return jsonify({"error": "Could not understand the audio. Please speak clearly and try again."}), 400
-            except sr.RequestError as e:
-                os.unlink(temp_file.name)
-                logger.error(f"Speech recognition service error: {str(e)}")
-                return jsonify({"error": "Speech recognition service is currently unavailable."}), 503
+            return jsonify({
+                "text": text,
+                "language": language,
+                "engine": engine,
+                "timestamp": datetime.now().isoformat()
+            })
+            
+        except sr.UnknownValueError:
+            return jsonify({"error": "Could not understand the audio. Please speak clearly and try again."}), 400
+        except AudioDecodeError as e:
+            logger.error(f"Audio decode error: {str(e)}")
+            return jsonify({"error": "Could not read this audio format. Please try recording again."}), 415
+        except (sr.RequestError, SpeechEngineUnavailableError) as e:
+            logger.error(f"Speech recognition service error: {str(e)}")
+            return jsonify({"error": "Speech recognition service is currently unavailable."}), 503
+        except UpstreamBusyError as e:
+            return upstream_busy_response(e)
             
     except Exception as e:
         logger.error(f"Voice processing error: {str(e)}")
         return jsonify({"error": "Failed to process voice input"}), 500
 
+def upload_file_info(file_info, extracted):
+    """Complete an upload's file_info with its extracted content"""
+    file_info = dict(file_info, **extracted)
+    if extracted.get("is_image"):
+        file_info["content_preview"] = f"Image file uploaded: {file_info['filename']}"
+    return file_info
+
+def process_upload_job(payload):
+    """Extract a stored upload in the background; returns the completed file_info"""
+    file_info = payload["file_info"]
+    filepath = payload["filepath"]
+    stored_name = os.path.basename(filepath)
+    extracted = extraction_cache.get(stored_name)
+    if extracted is None:
+        with open(filepath, 'rb') as f:
+            head = f.read(UPLOAD_HEAD_BYTES)
+        # Timeouts propagate so the job is retried instead of completing with a placeholder
+        extracted = extract_upload_content(filepath, file_info["type"], head, raise_timeouts=True)
+        extraction_cache.set(stored_name, extracted)
+    return upload_file_info(file_info, extracted)
+
+class UploadJobQueue:
+    """Persistent upload job queue in SQLite, drained by a worker thread pool in each process.
+    
+    Any process sharing the database can run any job and answer status
+    queries. A job left running by a dead worker is retaken once its lease
+    expires; failed attempts are retried with exponential backoff.
+    """
+    schema = (
+        "CREATE TABLE IF NOT EXISTS upload_jobs ("
+        "job_id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT NOT NULL, result TEXT, error TEXT, "
+        "attempts INTEGER NOT NULL DEFAULT 0, progress REAL NOT NULL DEFAULT 0, available_at REAL NOT NULL, "
+        "lease_expires REAL, created_at REAL NOT NULL, updated_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_upload_jobs_status ON upload_jobs (status, available_at)"
+    )
+    
+    def __init__(self, handler, path=UPLOAD_JOBS_DB_PATH, workers=UPLOAD_JOB_WORKERS, max_attempts=UPLOAD_JOB_MAX_ATTEMPTS):
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        # Autocommit mode so claiming a job can hold a write lock across its read and update
+        self._connections = SQLiteConnections(path, self.schema, isolation_level=None, row_factory=sqlite3.Row)
+        self._wakeup = threading.Event()
+        self._started_pid = None
+        self._start_lock = threading.Lock()
+    
+    def _connect(self):
+        return self._connections.get()
+    
+    def ensure_started(self):
+        """Start this process's workers; safe to call again, including after a fork"""
+        if self._started_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            for i in range(self.workers):
+                threading.Thread(target=self._work, name=f"upload-job-{i}", daemon=True).start()
+    
+    def submit(self, payload, result=None):
+        """Queue a job, or record it as completed when its result is already known"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO upload_jobs (job_id, status, payload, result, progress, available_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, 'queued' if result is None else 'completed', json.dumps(payload),
+             None if result is None else json.dumps(result), 0 if result is None else 1, now, now, now)
+        )
+        if result is None:
+            self.ensure_started()
+            self._wakeup.set()
+        return job_id
+    
+    def get(self, job_id):
+        row = self._connect().execute("SELECT * FROM upload_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row["job_id"],
+            "status": row["status"],
+            "progress": row["progress"],
+            "attempts": row["attempts"],
+            "error": row["error"],
+            "payload": json.loads(row["payload"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "created_at": datetime.fromtimestamp(row["created_at"]).isoformat(),
+            "updated_at": datetime.fromtimestamp(row["updated_at"]).isoformat()
+        }
+    
+    def cancel(self, job_id):
+        """Cancel a queued or running job; a running attempt finishes but its result is discarded"""
+        self._connect().execute(
+            "UPDATE upload_jobs SET status = 'cancelled', updated_at = ? WHERE job_id = ? AND status IN ('queued', 'running')",
+            (time.time(), job_id)
+        )
+        return self.get(job_id)
+    
+    def count(self, status):
+        return self._connect().execute("SELECT COUNT(*) FROM upload_jobs WHERE status = ?", (status,)).fetchone()[0]
+    
+    def ping(self):
+        self._connect().execute("SELECT 1")
+    
+    def _claim(self):
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE upload_jobs SET status = 'failed', error = 'Processing was interrupted', updated_at = ? "
+                "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+            row = conn.execute(
+                "SELECT job_id, payload, attempts FROM upload_jobs "
+                "WHERE (status = 'queued' AND available_at <= ?) OR (status = 'running' AND lease_expires < ?) "
+                "ORDER BY available_at LIMIT 1",
+                (now, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE upload_jobs SET status = 'running', attempts = attempts + 1, progress = 0.5, "
+                    "lease_expires = ?, updated_at = ? WHERE job_id = ?",
+                    (now + UPLOAD_JOB_LEASE, now, row["job_id"])
+                )
+            if random.random() < 0.01:
+                conn.execute(
+                    "DELETE FROM upload_jobs WHERE status IN ('completed', 'failed', 'cancelled') AND updated_at < ?",
+                    (now - UPLOAD_JOB_TTL,)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return None if row is None else (row["job_id"], json.loads(row["payload"]), row["attempts"] + 1)
+    
+    def _complete(self, job_id, result):
+        # Only a job still running is completed, so a cancellation made meanwhile stands
+        self._connect().execute(
+            "UPDATE upload_jobs SET status = 'completed', result = ?, progress = 1, error = NULL, updated_at = ? "
+            "WHERE job_id = ? AND status = 'running'",
+            (json.dumps(result), time.time(), job_id)
+        )
+    
+    def _retry_or_fail(self, job_id, attempts, error):
+        now = time.time()
+        if attempts < self.max_attempts:
+            status, available_at = 'queued', now + UPLOAD_JOB_RETRY_DELAY * 2 ** (attempts - 1)
+        else:
+            status, available_at = 'failed', now
+        self._connect().execute(
+            "UPDATE upload_jobs SET status = ?, error = ?, progress = 0, available_at = ?, updated_at = ? "
+            "WHERE job_id = ? AND status = 'running'",
+            (status, error, available_at, now, job_id)
+        )
+    
+    def _run_next(self):
+        """Claim and run one due job; return False when none is due"""
+        job = self._claim()
+        if job is None:
+            return False
+        
+        job_id, payload, attempts = job
+        try:
+            with timed_stage('upload_job'):
+                result = self.handler(payload)
+            self._complete(job_id, result)
+        except Exception as e:
+            logger.error(f"Upload job {job_id} attempt {attempts} failed: {str(e)}")
+            self._retry_or_fail(job_id, attempts, str(e))
+        return True
+    
+    def _work(self):
+        while True:
+            try:
+                ran = self._run_next()
+            except sqlite3.Error as e:
+                logger.error(f"Upload job queue error: {str(e)}")
+                ran = False
+            if not ran:
+                self._wakeup.wait(UPLOAD_JOB_POLL_INTERVAL)
+                self._wakeup.clear()
+
+upload_jobs = UploadJobQueue(process_upload_job)
+
 @app.route('/api/upload-file', methods=['POST'])
 def upload_file():
-    """Handle file uploads for chat context"""
+    """Handle file uploads for chat context; slow extraction continues as a background job"""
     try:
         if 'file' not in request.files:
             return jsonify({"error": "No file provided"}), 400
@@ -245,48 +3169,57 @@ def upload_file():
         
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            unique_filename = f"{timestamp}_{filename}"
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+            file_extension = filename.rsplit('.', 1)[1].lower()
             
-            file.save(filepath)
+            # The body has already been hashed while it was read; store it under that hash
+            sink = file.stream
+            content_hash = sink.sha256.hexdigest()
+            stored_name = f"{content_hash}.{file_extension}"
+            filepath = os.path.join(upload_folder(), stored_name)
             
-            # Process file based on type
-            file_extension = filename.rsplit('.', 1)[1].lower()
+            deduplicated = os.path.exists(filepath)
+            if deduplicated:
+                sink.discard()
+                os.utime(filepath)  # Keep recently re-uploaded files away from retention eviction
+            else:
+                sink.commit(filepath)
+            
+            # Server paths are never returned; images are referenced later through their handle
             file_info = {
                 "filename": filename,
-                "filepath": filepath,
-                "size": os.path.getsize(filepath),
+                "size": sink.size,
                 "type": file_extension,
+                "detected_type": sniff_file_type(sink.head),
+                "content_hash": content_hash,
+                "deduplicated": deduplicated,
                 "timestamp": datetime.now().isoformat()
             }
             
-            # Process different file types
-            content_preview = ""
+            # Reuse earlier results for identical content; only slow types are left to a worker
+            extracted = extraction_cache.get(stored_name)
+            if extracted is None and file_extension not in DEFERRED_EXTRACTION_TYPES:
+                extracted = extract_upload_content(filepath, file_extension, sink.head)
+                extraction_cache.set(stored_name, extracted)
+            if extracted is not None:
+                file_info = upload_file_info(file_info, extracted)
+            if file_info.get("is_image"):
+                file_info["image_handle"] = image_handles.create({
+                    "session_id": session_id,
+                    "filepath": filepath,
+                    "filename": filename
+                })
+            job_id = upload_jobs.submit({"file_info": file_info, "filepath": filepath}, result=file_info if extracted is not None else None)
             
-            if file_extension == 'txt':
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        content_preview = f.read()[:2000]  # Limit content length
-                except Exception as e:
-                    logger.error(f"Error reading text file: {str(e)}")
-                    content_preview = "Could not read file content"
-                    
-            elif file_extension == 'pdf':
-                content_preview = extract_text_from_pdf(filepath)
-                
-            elif file_extension in ['png', 'jpg', 'jpeg', 'gif']:
-                # For images, we'll process them differently in chat
-                content_preview = f"Image file uploaded: {filename}"
-                file_info["is_image"] = True
-                
-            file_info["content_preview"] = content_preview
+            enforce_upload_retention()
             
             return jsonify({
-                "message": "File uploaded successfully",
+                "message": "File uploaded successfully" if extracted is not None else "File uploaded; processing has started",
+                "job_id": job_id,
+                "status": "completed" if extracted is not None else "queued",
+                "status_url": f"/api/upload-status/{job_id}",
                 "file_info": file_info,
                 "session_id": session_id
-            })
+            }), 200 if extracted is not None else 202
         else:
             return jsonify({"error": f"File type not allowed. Supported types: {', '.join(ALLOWED_EXTENSIONS)}"}), 400
             
@@ -294,6 +3227,40 @@ def upload_file():
         logger.error(f"File upload error: {str(e)}")
         return jsonify({"error": "Failed to upload file"}), 500
 
+def upload_job_response(job):
+    body = {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "attempts": job["attempts"],
+        "file_info": job["result"] or job["payload"]["file_info"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "timestamp": datetime.now().isoformat()
+    }
+    if job["error"]:
+        body["error"] = job["error"]
+    return jsonify(body)
+
+@app.route('/api/upload-status/<job_id>', methods=['GET'])
+def get_upload_status(job_id):
+    """Report an upload job's progress and, once completed, its file_info with the content preview"""
+    upload_jobs.ensure_started()  # Resumes jobs from a previous run when create_app() was not called
+    job = upload_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Upload job not found"}), 404
+    return upload_job_response(job)
+
+@app.route('/api/upload-status/<job_id>/cancel', methods=['POST'])
+def cancel_upload_job(job_id):
+    """Cancel an upload job that has not finished yet"""
+    job = upload_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Upload job not found"}), 404
+    if job["status"] in ('completed', 'failed'):
+        return jsonify({"error": f"Upload job has already {job['status']}"}), 409
+    return upload_job_response(upload_jobs.cancel(job_id))
+
 @app.route('/api/chat-with-image', methods=['POST'])
 def chat_with_image():
     """Handle chat messages with image attachments"""
@@ -306,53 +3273,43 @@ def chat_with_image():
         user_message = data['message']
         session_id = data.get('session_id', 'default')
         language = data.get('language', 'en')
-        image_path = data.get('image_path', '')
+        image_handle = data.get('image_handle', '')
         
-        # Initialize chat history for session if not exists
-        if session_id not in chat_history:
-            chat_history[session_id] = []
+        if 'image_path' in data:
+            return jsonify({"error": "image_path is not supported; upload the image and send its image_handle"}), 400
         
-        # Add user message to history
-        chat_history[session_id].append({"role": "user", "content": user_message})
+        # Handles only resolve within the session that uploaded the image
+        image_record = image_handles.get(image_handle, session_id) if image_handle else None
+        if image_handle and image_record is None:
+            return jsonify({"error": "Image not found or expired. Please upload it again."}), 404
         
-        # Prepare context
-        context = get_digital_literacy_context()
+        # Load chat history for session and add user message
+        history = session_store.get(session_id)
+        history.append({"role": "user", "content": user_message})
         
         # Build conversation context
-        conversation_context = context + "\n\nConversation History:\n"
-        for msg in chat_history[session_id][-10:]:
-            conversation_context += f"{msg['role'].capitalize()}: {msg['content']}\n"
-        
-        if language == 'hi':
-            conversation_context += "\nPlease respond in Hindi (Devanagari script) when appropriate."
-        
-        conversation_context += f"\nCurrent User Message: {user_message}\n"
+        conversation_context = build_conversation_context(history, user_message, language)
         
         # Prepare content for Gemini
         content_parts = [conversation_context]
         
-        # Add image if provided
-        if image_path and os.path.exists(image_path):
+        # Add image if provided; after the first turn this is a file reference, not the image bytes
+        if image_record:
             try:
-                image_data = process_image_file(image_path)
-                if image_data:
-                    content_parts.append({
-                        "mime_type": image_data["mime_type"],
-                        "data": base64.b64decode(image_data["data"])
-                    })
+                part = image_part(image_handle, image_record)
+                if part:
+                    content_parts.append(part)
             except Exception as e:
                 logger.error(f"Error processing image for Gemini: {str(e)}")
         
         # Generate response using Gemini
-        response = model.generate_content(content_parts)
+        response = generate_content(content_parts)
         bot_response = response.text
+        response_size.observe(len(bot_response))
         
-        # Add bot response to history
-        chat_history[session_id].append({"role": "assistant", "content": bot_response})
-        
-        # Keep only last 20 messages to manage memory
-        if len(chat_history[session_id]) > 20:
-            chat_history[session_id] = chat_history[session_id][-20:]
+        # Add bot response to history (the store keeps only the last 20 messages)
+        history.append({"role": "assistant", "content": bot_response})
+        session_store.save(session_id, compact_history(history))
         
         return jsonify({
             "response": bot_response,
@@ -360,6 +3317,8 @@ def chat_with_image():
             "timestamp": datetime.now().isoformat()
         })
         
+    except UpstreamUnavailableError as e:
+        return upstream_busy_response(e)
     except Exception as e:
         logger.error(f"Chat with image error: {str(e)}")
         return jsonify({"error": "Failed to process chat message with image"}), 500
@@ -371,8 +3330,8 @@ def clear_chat():
         data = request.get_json()
         session_id = data.get('session_id', 'default')
         
-        if session_id in chat_history:
-            del chat_history[session_id]
+        session_store.delete(session_id)
+        image_handles.delete_session(session_id)
         
         return jsonify({
             "message": "Chat history cleared",
@@ -395,18 +3354,22 @@ def submit_feedback():
             if field not in data or not data[field].strip():
                 return jsonify({"error": f"Missing or empty required field: {field}"}), 400
         
+        try:
+            rating = int(data.get('rating') or 0)
+        except (TypeError, ValueError):
+            return jsonify({"error": "Rating must be a number"}), 400
+        
         feedback = {
-            "id": len(feedback_storage) + 1,
             "name": data['name'].strip(),
             "email": data['email'].strip(),
             "category": data['category'],
-            "rating": data.get('rating', 0),
+            "rating": rating,
             "message": data['message'].strip(),
             "timestamp": datetime.now().isoformat(),
             "status": "received"
         }
         
-        feedback_storage.append(feedback)
+        feedback["id"] = feedback_store.add(feedback)
         
         logger.info(f"New feedback received from {feedback['name']}: {feedback['category']}")
         
@@ -422,11 +3385,31 @@ def submit_feedback():
 
 @app.route('/api/feedback', methods=['GET'])
 def get_feedback():
-    """Get all feedback (admin endpoint)"""
+    """Get feedback with cursor pagination and filters (admin endpoint)"""
     try:
+        try:
+            cursor = request.args.get('cursor', type=int)
+            limit = min(request.args.get('limit', FEEDBACK_PAGE_SIZE, type=int), FEEDBACK_MAX_PAGE_SIZE)
+            filters = {
+                "category": request.args.get('category'),
+                "min_rating": request.args.get('min_rating', type=int),
+                "max_rating": request.args.get('max_rating', type=int),
+                "since": datetime.fromisoformat(request.args['since']).isoformat() if 'since' in request.args else None,
+                "until": datetime.fromisoformat(request.args['until']).isoformat() if 'until' in request.args else None
+            }
+        except ValueError:
+            return jsonify({"error": "Invalid date filter. Use ISO 8601, e.g. 2024-01-31T00:00:00"}), 400
+        
+        if limit < 1:
+            return jsonify({"error": "limit must be a positive integer"}), 400
+        
+        items, next_cursor = feedback_store.list(cursor=cursor, limit=limit, **filters)
+        aggregates = feedback_store.aggregates(**filters)
         return jsonify({
-            "feedback": feedback_storage,
-            "total_count": len(feedback_storage),
+            "feedback": items,
+            "total_count": aggregates["total_count"],
+            "next_cursor": next_cursor,
+            "aggregates": aggregates,
             "timestamp": datetime.now().isoformat()
         })
     except Exception as e:
@@ -435,139 +3418,25 @@ def get_feedback():
 
 @app.route('/api/tutorials', methods=['GET'])
 def get_tutorials():
-    """Get available tutorials"""
-    tutorials = {
-        "whatsapp": {
-            "title": "WhatsApp Basics",
-            "description": "Learn to send messages, make calls, and share photos on WhatsApp",
-            "difficulty": "Beginner",
-            "duration": "15 minutes",
-            "steps": [
-                "Download WhatsApp from Play Store or App Store",
-                "Enter your phone number for verification",
-                "Set up your profile with name and photo",
-                "Add contacts and start chatting",
-                "Learn to send photos and voice messages",
-                "Make voice and video calls",
-                "Create and manage group chats"
-            ],
-            "tips": [
-                "Always verify contacts before sharing personal information",
-                "Use strong privacy settings",
-                "Be careful about clicking unknown links"
-            ]
-        },
-        "paytm": {
-            "title": "Paytm & Digital Payments",
-            "description": "Master digital payments and money transfers safely",
-            "difficulty": "Intermediate",
-            "duration": "20 minutes",
-            "steps": [
-                "Download Paytm app from official app store",
-                "Complete KYC verification with Aadhaar",
-                "Link your bank account securely",
-                "Learn to scan QR codes for payments",
-                "Send money to contacts",
-                "Pay utility bills and recharge mobile",
-                "Check transaction history and receipts"
-            ],
-            "tips": [
-                "Never share your PIN or OTP with anyone",
-                "Always verify merchant details before payment",
-                "Keep your app updated for security",
-                "Enable app lock for additional security"
-            ]
-        },
-        "maps": {
-            "title": "Google Maps Navigation",
-            "description": "Find directions, locate places, and navigate with confidence",
-            "difficulty": "Beginner",
-            "duration": "15 minutes",
-            "steps": [
-                "Open Google Maps on your phone",
-                "Search for your destination",
-                "Select the best route option",
-                "Start navigation with voice guidance",
-                "Save frequently visited places",
-                "Share your location with family",
-                "Explore nearby restaurants and services"
-            ],
-            "tips": [
-                "Enable location services for accurate navigation",
-                "Download offline maps for areas with poor network",
-                "Use voice commands while driving for safety"
-            ]
-        },
-        "email": {
-            "title": "Email & Gmail",
-            "description": "Send and receive emails, manage your inbox effectively",
-            "difficulty": "Beginner",
-            "duration": "20 minutes",
-            "steps": [
-                "Create a Gmail account with strong password",
-                "Compose and send your first email",
-                "Reply to and forward messages",
-                "Attach files and photos to emails",
-                "Organize emails with labels and folders",
-                "Use search to find old emails",
-                "Set up email signature"
-            ],
-            "tips": [
-                "Use descriptive subject lines",
-                "Be cautious with email attachments from unknown senders",
-                "Enable two-factor authentication for security"
-            ]
-        },
-        "social": {
-            "title": "Social Media Safety",
-            "description": "Stay safe on Facebook, Instagram, and other social platforms",
-            "difficulty": "Intermediate",
-            "duration": "25 minutes",
-            "steps": [
-                "Set up strong privacy settings",
-                "Control who can see your posts",
-                "Recognize and report fake accounts",
-                "Avoid sharing personal information publicly",
-                "Be careful with friend requests from strangers",
-                "Report inappropriate content",
-                "Understand data sharing policies"
-            ],
-            "tips": [
-                "Think before you post - it stays online forever",
-                "Don't accept friend requests from strangers",
-                "Report and block suspicious accounts",
-                "Keep personal information private"
-            ]
-        },
-        "shopping": {
-            "title": "Online Shopping",
-            "description": "Shop safely on Amazon, Flipkart, and other e-commerce sites",
-            "difficulty": "Intermediate",
-            "duration": "30 minutes",
-            "steps": [
-                "Choose trusted shopping websites",
-                "Create account with secure password",
-                "Read product reviews and ratings",
-                "Compare prices across different sites",
-                "Use secure payment methods",
-                "Track your orders",
-                "Understand return and refund policies"
-            ],
-            "tips": [
-                "Always shop on secure websites (look for https://)",
-                "Read return policy before purchasing",
-                "Save receipts and order confirmations",
-                "Be wary of deals that seem too good to be true"
-            ]
-        }
-    }
-    
+    """Get available tutorials, optionally filtered by difficulty and paginated"""
     try:
-        return jsonify({
-            "tutorials": tutorials,
-            "total_count": len(tutorials),
-            "timestamp": datetime.now().isoformat()
-        })
+        difficulty = request.args.get('difficulty')
+        page = request.args.get('page', type=int)
+        per_page = request.args.get('per_page', type=int)
+        catalog = tutorial_catalogs.get(request.args.get('lang', 'en'))
+        
+        if page is not None and page < 1 or per_page is not None and per_page < 1:
+            return jsonify({"error": "page and per_page must be positive integers"}), 400
+        if catalog is None:
+            return jsonify({"error": f"Unsupported language. Supported languages: {', '.join(tutorial_catalogs)}"}), 400
+        
+        if difficulty is None and page is None and per_page is None:
+            body, etag = catalog.catalog_json, catalog.etag
+            return cached_json_response(body, etag, catalog.last_modified, lambda encoding: catalog.compressed(body, etag, encoding))
+        
+        # Filtered and paginated slices are rendered per request and compressed by compress_json_response
+        body, etag = catalog.list_json(difficulty, page or 1, per_page or TUTORIALS_PER_PAGE)
+        return cached_json_response(body, etag, catalog.last_modified)
     except Exception as e:
         logger.error(f"Get tutorials error: {str(e)}")
         return jsonify({"error": "Failed to retrieve tutorials"}), 500
@@ -576,30 +3445,168 @@ def get_tutorials():
 def get_tutorial(tutorial_id):
     """Get specific tutorial details"""
     try:
-        tutorials_response = get_tutorials()
-        tutorials_data = tutorials_response.get_json()
+        catalog = tutorial_catalogs.get(request.args.get('lang', 'en'))
+        if catalog is None:
+            return jsonify({"error": f"Unsupported language. Supported languages: {', '.join(tutorial_catalogs)}"}), 400
         
-        if tutorial_id in tutorials_data['tutorials']:
-            return jsonify({
-                "tutorial": tutorials_data['tutorials'][tutorial_id],
-                "tutorial_id": tutorial_id,
-                "timestamp": datetime.now().isoformat()
-            })
-        else:
+        entry = catalog.tutorial_json.get(tutorial_id)
+        if entry is None:
             return jsonify({"error": "Tutorial not found"}), 404
+        
+        body, etag = entry
+        return cached_json_response(body, etag, catalog.last_modified, lambda encoding: catalog.compressed(body, etag, encoding))
             
     except Exception as e:
         logger.error(f"Get tutorial error: {str(e)}")
         return jsonify({"error": "Failed to retrieve tutorial"}), 500
 
+@app.route('/api/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """Report response cache and FAQ index counters"""
+    return jsonify({
+        "response_cache": response_cache.stats(),
+        "faq_index": faq_index.stats(),
+        "timestamp": datetime.now().isoformat()
+    })
+
+def upload_folder_bytes():
+    total = 0
+    with os.scandir(upload_folder()) as it:
+        for entry in it:
+            if entry.is_file():
+                total += entry.stat().st_size
+    return total
+
+def gemini_circuit_open():
+    breaker = getattr(model, 'breaker', None)  # model stays None until first use
+    return int(breaker is not None and breaker.state != 'closed')
+
+def check_upload_folder():
+    folder = upload_folder()
+    if not os.access(folder, os.W_OK):
+        raise OSError(f"Upload folder {folder} is not writable")
+
+metrics.register(Gauge('dlh_upstream_in_flight', 'Outstanding Gemini and speech calls', lambda: upstream_limiter.in_flight))
+metrics.register(Gauge('dlh_upstream_waiting', 'Requests queued for an upstream call slot', lambda: upstream_limiter.waiting))
+metrics.register(Gauge('dlh_session_store_sessions', 'Chat sessions in the session store', lambda: len(session_store)))
+metrics.register(Gauge('dlh_upload_folder_bytes', 'Bytes stored in the upload folder', upload_folder_bytes))
+metrics.register(Gauge('dlh_upload_jobs_queued', 'Upload jobs waiting for a worker', lambda: upload_jobs.count('queued')))
+metrics.register(CallbackCounter('dlh_response_cache_hits_total', 'Response cache hits', lambda: response_cache.hits))
+metrics.register(CallbackCounter('dlh_response_cache_misses_total', 'Response cache misses', lambda: response_cache.misses))
+metrics.register(Gauge('dlh_response_cache_hit_ratio', 'Response cache hit ratio', lambda: response_cache.stats()["hit_ratio"]))
+metrics.register(Gauge('dlh_prepared_image_cache_bytes', 'Bytes held by the prepared image cache', lambda: prepared_image_cache.total_bytes))
+metrics.register(Gauge('dlh_gemini_circuit_open', '1 while the Gemini circuit breaker is not closed', gemini_circuit_open))
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Expose metrics in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """List stored request profiles, newest first"""
+    if not admin_authorized():
+        return jsonify({"error": "Not found"}), 404
+    return jsonify({"profiles": profile_store.list(), "max_profiles": profile_store.max_profiles})
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    """Download a stored profile (collapsed stacks as text, or cProfile pstats)"""
+    if not admin_authorized():
+        return jsonify({"error": "Not found"}), 404
+    found = profile_store.get(profile_id)
+    if found is None or not os.path.exists(found[0]):
+        return jsonify({"error": "Profile not found"}), 404
+    path, meta = found
+    mimetype = 'text/plain' if meta['filename'].endswith('.txt') else 'application/octet-stream'
+    return send_file(os.path.abspath(path), mimetype=mimetype, as_attachment=True, download_name=meta['filename'])
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Readiness check: verifies storage backends, the upload folder and the Gemini circuit"""
+    checks = {}
+    for name, check in (
+        ("session_store", session_store.ping),
+        ("feedback_store", feedback_store.ping),
+        ("upload_jobs", upload_jobs.ping),
+        ("upload_folder", check_upload_folder),
+    ):
+        try:
+            check()
+            checks[name] = "ok"
+        except Exception as e:
+            logger.error(f"Health check {name} failed: {str(e)}")
+            checks[name] = "failing"
+    healthy = all(status == "ok" for status in checks.values())
+    
+    # An open circuit affects every instance alike, so it degrades but does not fail readiness
+    checks["gemini"] = "degraded" if gemini_circuit_open() else "ok"
+    status = "unhealthy" if not healthy else "degraded" if gemini_circuit_open() else "healthy"
     return jsonify({
-        "status": "healthy",
+        "status": status,
+        "startup": dict(startup_report, module_load_seconds=LazyModule.load_times),
+        "checks": checks,
         "timestamp": datetime.now().isoformat(),
         "version": "1.0.0"
+    }), 200 if healthy else 503
+
+subsystem_loaders = {
+    "model": get_model,
+    "recognizer": get_recognizer,
+    "pdf": lambda: PyPDF2.PdfReader,
+    "image": lambda: Image.open
+}
+startup_report = {}
+
+def create_app(warm_up=None):
+    """Validate configuration, prepare runtime state and return the module's app.
+    
+    Stores, the upload folder and the FAQ index are also set up on first
+    use, so importing app:app directly still serves correctly; this moves
+    that work, and the heavy subsystems listed in warm_up (or the WARM_UP
+    setting), to startup so the first request does not pay for it.
+    """
+    started = time.perf_counter()
+    if not GEMINI_API_KEY:
+        logger.error("GEMINI_API_KEY not found in environment variables")
+        raise ValueError("GEMINI_API_KEY must be set in .env.local file")
+    
+    if RATE_LIMIT_ENABLED and RATE_LIMIT_BY_IP and not TRUSTED_PROXIES:
+        logger.warning("Per-IP rate limits are on without TRUSTED_PROXIES; behind a reverse proxy all clients share one bucket")
+    elif RATE_LIMIT_ENABLED and not RATE_LIMIT_BY_IP:
+        logger.info("Per-IP rate limits are off; set TRUSTED_PROXIES behind a proxy, or RATE_LIMIT_BY_IP=true when serving clients directly")
+    
+    # Create upload directory if it doesn't exist
+    upload_folder()
+    
+    # Resume queued uploads, including any left behind by a previous run
+    upload_jobs.ensure_started()
+    
+    # Index the frontend build and write any missing precompressed variants
+    static_assets.load()
+    
+    # Map the prebuilt FAQ index; without it every question goes to Gemini
+    faq_index.ensure_loaded()
+    
+    warm_up = WARM_UP if warm_up is None else warm_up
+    names = list(subsystem_loaders) if warm_up == 'all' else [name.strip() for name in warm_up.split(',') if name.strip()]
+    warm_up_times = {}
+    for name in names:
+        if name not in subsystem_loaders:
+            logger.warning(f"Unknown warm-up subsystem: {name}")
+            continue
+        subsystem_started = time.perf_counter()
+        subsystem_loaders[name]()
+        warm_up_times[name] = round(time.perf_counter() - subsystem_started, 4)
+    
+    startup_report.update({
+        "import_seconds": round(started - _import_started, 4),
+        "init_seconds": round(time.perf_counter() - started, 4),
+        "warm_up_seconds": warm_up_times,
+        "lazy_subsystems": [name for name in subsystem_loaders if name not in warm_up_times]
     })
+    logger.info(f"Backend ready: {json.dumps(startup_report)}")
+    return app
 
 @app.errorhandler(413)
 def too_large(e):
@@ -614,9 +3621,6 @@ def internal_error(e):
     return jsonify({"error": "Internal server error"}), 500
 
 if __name__ == '__main__':
-    # Ensure all required directories exist
-    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-    
     # Check if API key is properly loaded
     if not GEMINI_API_KEY:
         print("ERROR: GEMINI_API_KEY not found in .env.local file")
@@ -627,6 +3631,7 @@ if __name__ == '__main__':
     print("🚀 Digital Literacy Hub Backend Starting...")
     print("📋 Features enabled:")
     print("   ✓ AI Chat with Gemini Flash")
+    print("   ✓ Streaming chat responses (SSE)")
     print("   ✓ Voice-to-Text conversion")
     print("   ✓ File upload and processing")
     print("   ✓ Image analysis")
@@ -637,4 +3642,5 @@ if __name__ == '__main__':
     print("📁 Upload folder:", UPLOAD_FOLDER)
     print("🔑 API Key loaded successfully")
     
+    create_app()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
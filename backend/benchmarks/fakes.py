@@ -0,0 +1,65 @@
+"""Deterministic local stand-ins for Gemini and speech recognition.
+
+Used by the benchmark suite so the backend can be measured offline with
+controlled upstream latency.
+"""
+import hashlib
+import time
+
+WORDS = (
+    "open the app tap the green button then choose your contact and type your message "
+    "press send to share it never share your PIN or OTP with anyone always check the name"
+).split()
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Fake Gemini model with a fixed first-token latency and a token rate.
+
+    Answers are derived from a hash of the prompt, so the same prompt always
+    gets the same answer.
+    """
+    def __init__(self, latency=0.2, tokens_per_second=200.0, response_tokens=120, chunk_tokens=8):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.chunk_tokens = chunk_tokens
+        self.calls = 0
+
+    def _tokens(self, content):
+        parts = content if isinstance(content, list) else [content]
+        digest = hashlib.sha256("".join(str(part) if not isinstance(part, dict) else part.get("mime_type", "")
+                                        for part in parts).encode('utf-8')).digest()
+        return [WORDS[(digest[i % len(digest)] + i) % len(WORDS)] for i in range(self.response_tokens)]
+
+    def generate_content(self, content, stream=False, request_options=None):
+        self.calls += 1
+        tokens = self._tokens(content)
+        time.sleep(self.latency)
+        if stream:
+            return self._stream(tokens)
+        time.sleep(len(tokens) / self.tokens_per_second)
+        return FakeResponse(" ".join(tokens))
+
+    def _stream(self, tokens):
+        for start in range(0, len(tokens), self.chunk_tokens):
+            chunk = tokens[start:start + self.chunk_tokens]
+            time.sleep(len(chunk) / self.tokens_per_second)
+            yield FakeResponse(" ".join(chunk) + " ")
+
+
+class FakeSpeechEngine:
+    """Fake speech engine that returns a fixed transcript after a delay"""
+    name = 'google'
+
+    def __init__(self, latency=0.3):
+        self.latency = latency
+
+    def transcribe(self, audio, language):
+        time.sleep(self.latency)
+        seconds = len(audio.get_raw_data()) / (audio.sample_rate * audio.sample_width)
+        return f"how do I send a photo on whatsapp ({seconds:.1f}s)"
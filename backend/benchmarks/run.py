@@ -0,0 +1,317 @@
+"""Load tests and micro-benchmarks for the backend against fake upstreams.
+
+Boots the Flask app on a local threaded server with a deterministic fake
+Gemini model and a fake speech engine, drives the main endpoints at a fixed
+concurrency and reports latency percentiles and throughput. No API key or
+network access is needed.
+
+Run from the repository root:
+
+    python backend/benchmarks/run.py                      # print results
+    python backend/benchmarks/run.py --save-baseline      # record baseline.json
+    python backend/benchmarks/run.py --compare            # fail on p95 regressions
+"""
+import argparse
+import io
+import json
+import math
+import os
+import statistics
+import struct
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+
+def setup_app(args, workdir):
+    """Import the app with throwaway storage and fake upstreams"""
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark-fake-key')
+    os.environ['FEEDBACK_DB_PATH'] = os.path.join(workdir, 'feedback.db')
+    os.environ['SESSION_DB_PATH'] = os.path.join(workdir, 'sessions.db')
+    os.environ['UPLOAD_JOBS_DB_PATH'] = os.path.join(workdir, 'upload_jobs.db')
+    os.environ['UPSTREAM_CONCURRENCY'] = str(max(args.concurrency, 1) * 2)
+    os.environ['RATE_LIMIT_ENABLED'] = 'false'  # Load comes from one address by design
+    os.environ['IMAGE_FILES'] = 'local'
+    sys.path.insert(0, BACKEND_DIR)
+    sys.path.insert(0, BENCHMARK_DIR)
+
+    import app as backend
+    from fakes import FakeGenerativeModel, FakeSpeechEngine
+
+    backend.model = backend.ResilientModel(FakeGenerativeModel(
+        latency=args.model_latency, tokens_per_second=args.token_rate
+    ))
+    backend.speech_engines['google'] = FakeSpeechEngine(latency=args.speech_latency)
+    backend.app.config['UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+    backend.create_app()
+    logging_level = backend.logging.WARNING
+    backend.logging.getLogger().setLevel(logging_level)
+    backend.logging.getLogger('werkzeug').setLevel(logging_level)
+    return backend
+
+
+def start_server(flask_app):
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def http(method, url, body=None, headers=None):
+    request = urllib.request.Request(url, data=body, method=method, headers=headers or {})
+    with urllib.request.urlopen(request, timeout=120) as response:
+        return response.status, response.read()
+
+
+def post_json(url, payload):
+    return http('POST', url, json.dumps(payload).encode('utf-8'), {'Content-Type': 'application/json'})
+
+
+def post_multipart(url, fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8'))
+    for name, (filename, data) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'.encode('utf-8') + data + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return http('POST', url, b''.join(parts), {'Content-Type': f'multipart/form-data; boundary={boundary}'})
+
+
+def make_pdf(pages, words_per_page=300):
+    """Build a text PDF with the given number of pages"""
+    text = " ".join(f"Step {i} open WhatsApp and tap the chat" for i in range(words_per_page // 7))
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        stream = f"BT /F1 10 Tf 40 800 Td (Page {page} {text}) Tj ET".encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), pages)
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def make_image(width=4000, height=3000):
+    from PIL import Image
+
+    img = Image.new('RGB', (width, height))
+    pixels = img.load()
+    for x in range(0, width, 8):
+        for y in range(0, height, 8):
+            pixels[x, y] = (x % 256, y % 256, (x * y) % 256)
+    out = io.BytesIO()
+    img.save(out, format='JPEG', quality=90)
+    return out.getvalue()
+
+
+def make_wav(seconds=3.0, rate=16000):
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(b''.join(struct.pack('<h', int(6000 * math.sin(i / 6))) for i in range(int(seconds * rate))))
+    return out.getvalue()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, errors, wall_seconds):
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        "throughput_rps": round(len(latencies) / wall_seconds, 2) if wall_seconds else None
+    }
+
+
+def run_load(call, requests, concurrency):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            call(i)
+        except (urllib.error.URLError, OSError, ValueError):
+            with lock:
+                errors += 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def load_scenarios(base_url):
+    pdf = make_pdf(40)
+    image = make_image()
+    wav = make_wav()
+    status, body = post_multipart(f"{base_url}/api/upload-file", {"session_id": "bench-image"}, {"file": ("photo.jpg", image)})
+    image_handle = json.loads(body)["file_info"]["image_handle"]
+
+    return {
+        "chat": lambda i: post_json(f"{base_url}/api/chat", {
+            "message": f"How do I send a photo on WhatsApp? (question {i})", "session_id": f"bench-chat-{i}"
+        }),
+        "chat_with_image": lambda i: post_json(f"{base_url}/api/chat-with-image", {
+            "message": f"What does this screen mean? ({i})", "session_id": "bench-image", "image_handle": image_handle
+        }),
+        # Unique bytes per request so dedup and the extraction cache do not hide parsing cost
+        "upload_pdf": lambda i: post_multipart(f"{base_url}/api/upload-file", {"session_id": f"bench-upload-{i}"}, {
+            "file": (f"manual-{i}.pdf", pdf + f"\n% {uuid.uuid4().hex}\n".encode('ascii'))
+        }),
+        "tutorials": lambda i: http('GET', f"{base_url}/api/tutorials"),
+        "voice_to_text": lambda i: post_multipart(f"{base_url}/api/voice-to-text", {"language": "en"}, {
+            "audio": ("clip.wav", wav)
+        }),
+    }
+
+
+def micro(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return {
+        "repeat": repeat,
+        "mean_ms": round(statistics.mean(timings) * 1000, 3),
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 95) * 1000, 3)
+    }
+
+
+def micro_benchmarks(backend, workdir, repeat):
+    pdf_path = os.path.join(workdir, 'manual.pdf')
+    with open(pdf_path, 'wb') as f:
+        f.write(make_pdf(300))
+    image_path = os.path.join(workdir, 'photo.jpg')
+    with open(image_path, 'wb') as f:
+        f.write(make_image())
+
+    history = []
+    for i in range(12):
+        history.append({"role": "user", "content": f"Question {i} about Paytm UPI PIN " * 20})
+        history.append({"role": "assistant", "content": f"Answer {i} with several steps " * 60})
+    history = backend.compact_history(history)
+
+    def process_image_cold():
+        backend.prepared_image_cache = backend.PreparedImageCache()
+        backend.process_image_file(image_path)
+
+    return {
+        "extract_text_from_pdf": micro(lambda: backend.extract_text_from_pdf(pdf_path), repeat),
+        "process_image_file_cold": micro(process_image_cold, max(repeat // 5, 3)),
+        "process_image_file_cached": micro(lambda: backend.process_image_file(image_path), repeat),
+        "build_conversation_context": micro(
+            lambda: backend.build_conversation_context(history, "How do I reset my UPI PIN?", "hi", "x" * 1500),
+            repeat * 10
+        )
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions where p95 grew beyond the tolerance"""
+    regressions = []
+    for group in ('load', 'micro'):
+        for name, current in results.get(group, {}).items():
+            previous = baseline.get(group, {}).get(name)
+            if not previous or not previous.get('p95_ms') or current.get('p95_ms') is None:
+                continue
+            limit = previous['p95_ms'] * (1 + tolerance)
+            if current['p95_ms'] > limit:
+                regressions.append(f"{group}/{name}: p95 {current['p95_ms']}ms > {limit:.2f}ms (baseline {previous['p95_ms']}ms)")
+            if current.get('errors'):
+                regressions.append(f"{group}/{name}: {current['errors']} errors")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100, help='requests per load scenario')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--model-latency', type=float, default=0.2, help='fake Gemini time to first token (s)')
+    parser.add_argument('--token-rate', type=float, default=400.0, help='fake Gemini tokens per second')
+    parser.add_argument('--speech-latency', type=float, default=0.3, help='fake recognizer latency (s)')
+    parser.add_argument('--repeat', type=int, default=20, help='iterations per micro-benchmark')
+    parser.add_argument('--only', action='append', help='run only the named load scenario(s)')
+    parser.add_argument('--save-baseline', action='store_true', help=f'write results to {BASELINE_PATH}')
+    parser.add_argument('--compare', action='store_true', help='exit non-zero if p95 regresses past the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 growth when comparing')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='dlh-bench-') as workdir:
+        backend = setup_app(args, workdir)
+        server, base_url = start_server(backend.app)
+        try:
+            results = {"config": {k: v for k, v in vars(args).items() if k not in ('save_baseline', 'compare', 'only')},
+                       "load": {}}
+            for name, call in load_scenarios(base_url).items():
+                if args.only and name not in args.only:
+                    continue
+                results["load"][name] = run_load(call, args.requests, args.concurrency)
+                print(f"{name:<28} {json.dumps(results['load'][name])}")
+            results["micro"] = micro_benchmarks(backend, workdir, args.repeat)
+            for name, stats in results["micro"].items():
+                print(f"{name:<28} {json.dumps(stats)}")
+        finally:
+            server.shutdown()
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+
+    if args.compare:
+        with open(BASELINE_PATH, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,16 @@
+"""Build the FAQ retrieval index from faq.json, tutorials.json and its translations.
+
+Run from the repository root after editing any of them:
+
+    python backend/build_faq_index.py
+
+The TF-IDF matrix (as term-major CSR arrays) and its metadata are written
+to FAQ_INDEX_DIR (backend/faq_index by default). Workers memory-map the
+arrays at startup, so restart them to pick up a rebuilt index.
+"""
+import json
+
+from content_build import build_faq_index
+
+if __name__ == '__main__':
+    print(json.dumps(build_faq_index()))
@@ -0,0 +1,20 @@
+"""Build tutorial catalog translations with Gemini.
+
+Run from the repository root after editing tutorials.json:
+
+    python backend/build_tutorial_translations.py [language ...]
+
+Translations are written beside the catalog (tutorials.hi.json for Hindi).
+Only tutorials added or changed since their last translation are sent to
+Gemini; restart the workers to serve the new files. Review the output
+before committing it.
+"""
+import json
+import sys
+
+from content_build import TUTORIAL_LANGUAGES, build_tutorial_translations
+
+if __name__ == '__main__':
+    languages = sys.argv[1:] or [language for language in TUTORIAL_LANGUAGES if language != 'en']
+    for language in languages:
+        print(json.dumps(build_tutorial_translations(language)))
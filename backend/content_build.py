@@ -0,0 +1,202 @@
+"""Tutorial catalog translations and the FAQ retrieval index.
+
+Holds the data file locations and text helpers shared by the server and
+the offline build steps (build_tutorial_translations.py and
+build_faq_index.py). Importing it is cheap: numpy and the Gemini SDK are
+only imported by the build functions that need them.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+from collections import Counter
+
+from dotenv import load_dotenv
+
+# Same settings file as the server, so both resolve the same data paths
+load_dotenv('backend/.env.local')
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Tutorial catalog data files
+TUTORIALS_PATH = os.getenv('TUTORIALS_PATH', os.path.join(BACKEND_DIR, 'tutorials.json'))
+TUTORIAL_LANGUAGES = {'en': 'English', 'hi': 'Hindi'}  # Translations live beside the catalog, e.g. tutorials.hi.json
+TRANSLATION_MODEL = os.getenv('TRANSLATION_MODEL', 'gemini-1.5-flash')
+
+# FAQ retrieval over the curated FAQ and the tutorial catalog
+FAQ_PATH = os.getenv('FAQ_PATH', os.path.join(BACKEND_DIR, 'faq.json'))
+FAQ_INDEX_DIR = os.getenv('FAQ_INDEX_DIR', os.path.join(BACKEND_DIR, 'faq_index'))
+FAQ_STOPWORDS = frozenset(
+    "a an the to how do i can my me is are am what which where of in on for with and or you your it this that be does "
+    "should please है का की के में से को और कैसे क्या मैं मुझे मेरा मेरी करें करूं कर एक पर यह ये हूँ हैं ने तो भी "
+    "kaise kya hai ka ki ke me se ko mera meri".split()
+)
+FAQ_TOKEN_PATTERN = re.compile(r"[\w\u0900-\u0963\u0966-\u097F]+")  # Devanagari vowel signs are not \w
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def tutorial_translations_path(language, path=TUTORIALS_PATH):
+    return f"{os.path.splitext(path)[0]}.{language}.json"
+
+def tutorial_source_hash(entry):
+    """Hash of an English catalog entry, recorded with its translation to detect stale ones"""
+    return hashlib.sha256(json.dumps(entry, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def load_tutorial_translations(language, path=TUTORIALS_PATH):
+    """Translated entries by tutorial id; empty when no translation file exists"""
+    translations_path = tutorial_translations_path(language, path)
+    if not os.path.exists(translations_path):
+        return {}
+    with open(translations_path, 'r', encoding='utf-8') as f:
+        return {entry['id']: entry for entry in json.load(f)['tutorials']}
+
+def translation_model():
+    """Plain Gemini model for translating, without the assistant's system instruction"""
+    import google.generativeai as genai
+    api_key = os.getenv('GEMINI_API_KEY')
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY must be set in .env.local file")
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(TRANSLATION_MODEL)
+
+def translate_tutorial(entry, language, model):
+    """Translate one catalog entry with Gemini, keeping its structure"""
+    source = {key: value for key, value in entry.items() if key != 'id'}
+    prompt = (
+        f"Translate the string values of this JSON object into simple {TUTORIAL_LANGUAGES[language]} "
+        "for elderly learners. Keep app names, brand names and URLs as they are, and keep every key and the "
+        "number of list items unchanged. Reply with the JSON object only.\n\n"
+        + json.dumps(source, ensure_ascii=False)
+    )
+    text = model.generate_content(prompt).text.strip()
+    if text.startswith("```"):
+        text = text.strip("`").split("\n", 1)[1]
+    translated = json.loads(text)
+    if set(translated) != set(source) or any(len(translated[key]) != len(source[key]) for key in ('steps', 'tips')):
+        raise ValueError(f"Translation of {entry['id']} does not match the source structure")
+    return translated
+
+def build_tutorial_translations(language, path=TUTORIALS_PATH, model=None):
+    """Translate catalog entries that are new or changed since their last translation.
+
+    Current translations are reused, so rebuilding after a catalog edit only
+    pays for the edited tutorials.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)['tutorials']
+    existing = load_tutorial_translations(language, path)
+
+    tutorials = []
+    translated = 0
+    for entry in entries:
+        source_hash = tutorial_source_hash(entry)
+        translation = existing.get(entry['id'])
+        if translation is None or translation.get('source_hash') != source_hash:
+            model = model or translation_model()
+            translation = {"id": entry['id'], **translate_tutorial(entry, language, model), "source_hash": source_hash}
+            translated += 1
+        tutorials.append(translation)
+
+    translations_path = tutorial_translations_path(language, path)
+    with open(translations_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({"language": language, "tutorials": tutorials}, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(translations_path + '.tmp', translations_path)
+    return {"language": language, "translated": translated, "reused": len(entries) - translated}
+
+def faq_terms(text):
+    """Unigram and bigram terms used by the FAQ index"""
+    words = [word for word in FAQ_TOKEN_PATTERN.findall(text.lower()) if word not in FAQ_STOPWORDS]
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+def faq_sources(faq_path=FAQ_PATH, tutorials_path=TUTORIALS_PATH):
+    """Data files the FAQ index is built from"""
+    translations = [tutorial_translations_path(language, tutorials_path) for language in TUTORIAL_LANGUAGES if language != 'en']
+    return [faq_path, tutorials_path] + [path for path in translations if os.path.exists(path)]
+
+def faq_documents(faq_path=FAQ_PATH, tutorials_path=TUTORIALS_PATH):
+    """Documents indexed for retrieval: every FAQ phrasing plus each tutorial step and tip, in every catalog language"""
+    with open(faq_path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)['faq']
+    with open(tutorials_path, 'r', encoding='utf-8') as f:
+        tutorials = json.load(f)['tutorials']
+
+    documents = []
+    for entry in entries:
+        snippet = f"Q: {entry['questions'][0]}\nA: {entry['answer']}"
+        for question in entry['questions']:
+            documents.append({"kind": "faq", "ref": entry['id'], "language": entry['language'],
+                              "text": question, "snippet": snippet, "answer": entry['answer']})
+    for language in TUTORIAL_LANGUAGES:
+        translations = load_tutorial_translations(language, tutorials_path) if language != 'en' else {}
+        for tutorial in tutorials:
+            if language != 'en':
+                translation = translations.get(tutorial['id'])
+                if translation is None or translation.get('source_hash') != tutorial_source_hash(tutorial):
+                    continue
+                tutorial = translation
+            for number, step in enumerate(tutorial['steps'], 1):
+                documents.append({"kind": "step", "ref": tutorial['id'], "language": language,
+                                  "text": f"{tutorial['title']}: {step}", "snippet": f"{tutorial['title']}, step {number}: {step}"})
+            for tip in tutorial['tips']:
+                documents.append({"kind": "tip", "ref": tutorial['id'], "language": language,
+                                  "text": f"{tutorial['title']}: {tip}", "snippet": f"{tutorial['title']} tip: {tip}"})
+    return documents
+
+def build_faq_index(output_dir=FAQ_INDEX_DIR, faq_path=FAQ_PATH, tutorials_path=TUTORIALS_PATH):
+    """Build the TF-IDF matrix offline and write it next to its metadata.
+    
+    The matrix is stored term-major in CSR form (indptr, indices and data
+    arrays), so its size follows the number of non-zero weights rather than
+    vocabulary x documents.
+    """
+    import numpy as np
+
+    documents = faq_documents(faq_path, tutorials_path)
+    document_terms = [Counter(faq_terms(document['text'])) for document in documents]
+    vocabulary = sorted(set().union(*document_terms))
+    term_ids = {term: i for i, term in enumerate(vocabulary)}
+
+    document_frequency = np.zeros(len(vocabulary))
+    for terms in document_terms:
+        document_frequency[[term_ids[term] for term in terms]] += 1
+    idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1
+
+    # Term-major layout so a query reads one contiguous row per query term
+    rows = [[] for _ in vocabulary]
+    for column, terms in enumerate(document_terms):
+        weights = {term: (1 + math.log(count)) * idf[term_ids[term]] for term, count in terms.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+        for term, weight in weights.items():
+            rows[term_ids[term]].append((column, weight / norm))
+    arrays = {
+        "indptr": np.cumsum([0] + [len(row) for row in rows], dtype=np.int64),
+        "indices": np.array([column for row in rows for column, _ in row], dtype=np.int32),
+        "data": np.array([weight for row in rows for _, weight in row], dtype=np.float32)
+    }
+
+    meta = {
+        "sources": {os.path.basename(path): file_sha256(path) for path in faq_sources(faq_path, tutorials_path)},
+        "vocabulary": vocabulary,
+        "idf": idf.tolist(),
+        "documents": documents
+    }
+
+    # Replace the files atomically; running workers keep their mapping of the old matrix
+    os.makedirs(output_dir, exist_ok=True)
+    paths = [os.path.join(output_dir, f"{name}.npy") for name in arrays]
+    meta_path = os.path.join(output_dir, 'meta.json')
+    for path, array in zip(paths, arrays.values()):
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, array)
+    with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    for path in paths + [meta_path]:
+        os.replace(path + '.tmp', path)
+    return {"documents": len(documents), "terms": len(vocabulary), "weights": len(arrays["data"])}
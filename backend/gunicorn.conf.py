@@ -0,0 +1,38 @@
+"""Gunicorn settings for wsgi:app; see wsgi.py for the concurrency ceiling"""
+import os
+
+from dotenv import load_dotenv
+
+# Same settings file as the app, so the checks below see the stores it will use
+load_dotenv('backend/.env.local')
+
+pythonpath = os.path.dirname(os.path.abspath(__file__))
+bind = os.getenv('BIND', '0.0.0.0:5000')
+worker_class = 'gthread'
+workers = int(os.getenv('WEB_WORKERS', '1'))  # Scale with threads; see on_starting before raising this
+threads = int(os.getenv('WEB_THREADS', os.getenv('UPSTREAM_CONCURRENCY', '64')))  # Requests in flight per process
+timeout = int(os.getenv('WEB_TIMEOUT', '120'))  # Seconds a worker may go without a heartbeat
+keepalive = 5
+
+def on_starting(server):
+    """Refuse to run several workers while per-process state would split between them.
+
+    Gunicorn does not pin a client to a worker, so chat history, image
+    handles and rate limits must live in a shared store. Voice streams have
+    no shared store; the app disables them when WEB_WORKERS is above one.
+    """
+    if server.cfg.workers <= 1:
+        return
+    per_process = []
+    if os.getenv('SESSION_STORE', 'memory') == 'memory':
+        per_process.append("SESSION_STORE=memory (chat history and image handles)")
+    rate_limited = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    if rate_limited and os.getenv('RATE_LIMIT_STORE', 'memory') == 'memory':
+        per_process.append("RATE_LIMIT_STORE=memory (rate limits)")
+    if per_process:
+        raise RuntimeError(
+            f"{server.cfg.workers} workers need shared stores, but these are per process: {', '.join(per_process)}. "
+            "Use one worker and raise WEB_THREADS, or configure SESSION_STORE=sqlite|redis and RATE_LIMIT_STORE=sqlite."
+        )
+    # Workers import the app after this hook, so it sees the real worker count even when set with -w
+    os.environ['WEB_WORKERS'] = str(server.cfg.workers)
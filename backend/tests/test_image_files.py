@@ -0,0 +1,70 @@
+"""Tests for Gemini Files API registration of prepared images, against a fake upload client.
+
+Run from the repository root:
+
+    python -m unittest discover -s backend/tests
+"""
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as backend
+
+
+class FakeGenai:
+    def __init__(self):
+        self.uploads = 0
+
+    def upload_file(self, data, mime_type, display_name):
+        self.uploads += 1
+        return mock.Mock(uri=f"https://files.example/{self.uploads}")
+
+
+def image(data):
+    return {"mime_type": "image/jpeg", "data": data}
+
+
+class GeminiImageFilesTests(unittest.TestCase):
+    def setUp(self):
+        self.genai = FakeGenai()
+        patches = [mock.patch.object(backend, 'genai', self.genai), mock.patch.object(backend, 'get_model')]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_identical_images_are_uploaded_once(self):
+        files = backend.GeminiImageFiles()
+        first = files.register(image(b"same"), "a.jpg")
+        second = files.register(image(b"same"), "b.jpg")
+        self.assertEqual(self.genai.uploads, 1)
+        self.assertEqual(files.part(first), files.part(second))
+        self.assertEqual(files.part(first)["file_data"]["file_uri"], "https://files.example/1")
+
+    def test_expired_uploads_are_registered_again(self):
+        files = backend.GeminiImageFiles(max_age=0.05)
+        ref = files.register(image(b"old"), "a.jpg")
+        time.sleep(1.1)  # References record whole seconds
+        self.assertIsNone(files.part(ref))
+        fresh = files.register(image(b"old"), "a.jpg")
+        self.assertEqual(self.genai.uploads, 2)
+        self.assertNotEqual(fresh, ref)
+
+    def test_process_cache_is_bounded(self):
+        files = backend.GeminiImageFiles(max_entries=2)
+        for data in (b"one", b"two", b"three"):
+            files.register(image(data), "a.jpg")
+        self.assertEqual(len(files._uploaded), 2)
+        files.register(image(b"one"), "a.jpg")  # Evicted, so uploaded again
+        self.assertEqual(self.genai.uploads, 4)
+
+    def test_references_without_upload_time_are_treated_as_expired(self):
+        files = backend.GeminiImageFiles()
+        self.assertIsNone(files.part("image/jpeg|https://files.example/legacy"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""Tests for request metrics on streamed responses and the metric exposition.
+
+Run from the repository root:
+
+    python -m unittest discover -s backend/tests
+"""
+import os
+import sys
+import time
+import unittest
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as backend
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class SlowStreamingModel:
+    """Streams a few chunks with a pause before each"""
+    def __init__(self, pause):
+        self.pause = pause
+
+    def generate_content(self, content, stream=False, request_options=None):
+        def chunks():
+            for word in ("one ", "two ", "three"):
+                time.sleep(self.pause)
+                yield FakeChunk(word)
+        return chunks()
+
+
+class MetricsTests(unittest.TestCase):
+    def setUp(self):
+        self.original_model = backend.model
+        backend.model = backend.ResilientModel(SlowStreamingModel(pause=0.1))
+        self.client = backend.app.test_client()
+
+    def tearDown(self):
+        backend.model = self.original_model
+
+    def stream_latency(self):
+        for key, state in backend.request_latency._values.items():
+            if key[0] == '/api/chat/stream':
+                return state[-2], state[-1]
+        return 0.0, 0
+
+    def test_streamed_latency_covers_the_body(self):
+        before_sum, before_count = self.stream_latency()
+        response = self.client.post('/api/chat/stream', json={
+            "message": f"metrics test {uuid.uuid4().hex}", "session_id": uuid.uuid4().hex
+        })
+        self.assertEqual(self.stream_latency()[1], before_count)  # Body not sent yet
+        self.assertIn(b"event: done", response.data)
+        total, count = self.stream_latency()
+        self.assertEqual(count, before_count + 1)
+        self.assertGreaterEqual(total - before_sum, 0.3)
+
+    def prompt_counts(self):
+        stage = backend.stage_latency._values.get(('prompt_assembly',), [0])[-1]
+        return stage, sum(state[-1] for state in backend.prompt_size._values.values())
+
+    def test_prompt_metrics_only_count_turns_sent_to_gemini(self):
+        before = self.prompt_counts()
+        response = self.client.post('/api/chat/stream', json={
+            "message": "How do I make a video call on WhatsApp?", "session_id": uuid.uuid4().hex
+        })
+        self.assertIn(b"event: done", response.data)
+        self.assertEqual(self.prompt_counts(), before)  # Answered from the FAQ
+
+        response = self.client.post('/api/chat/stream', json={
+            "message": f"metrics test {uuid.uuid4().hex}", "session_id": uuid.uuid4().hex
+        })
+        self.assertIn(b"event: done", response.data)
+        self.assertEqual(self.prompt_counts(), (before[0] + 1, before[1] + 1))
+
+    def test_cumulative_cache_counts_are_counters(self):
+        text = backend.metrics.render()
+        self.assertIn("# TYPE dlh_response_cache_hits_total counter", text)
+        self.assertIn("# TYPE dlh_response_cache_misses_total counter", text)
+        self.assertIn("# TYPE dlh_response_cache_hit_ratio gauge", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
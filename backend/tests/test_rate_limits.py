@@ -0,0 +1,104 @@
+"""Tests for rate limiting of batch chat and per-IP buckets.
+
+Run from the repository root:
+
+    python -m unittest discover -s backend/tests
+"""
+import json
+import os
+import sys
+import time
+import unittest
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as backend
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class EchoModel:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, content, stream=False, request_options=None):
+        self.calls += 1
+        return FakeResponse("answer")
+
+
+class BatchRateLimitTests(unittest.TestCase):
+    def setUp(self):
+        self.original_model = backend.model
+        self.original_buckets = backend.rate_limit_buckets
+        self.original_rate = backend.RATE_LIMIT_SESSION_PER_MINUTE
+        self.model = EchoModel()
+        backend.model = backend.ResilientModel(self.model)
+        backend.rate_limit_buckets = backend.InMemoryTokenBuckets()
+        backend.RATE_LIMIT_SESSION_PER_MINUTE = 600  # 10 tokens a second keeps paced tests short
+        self.client = backend.app.test_client()
+        self.session_id = uuid.uuid4().hex
+
+    def tearDown(self):
+        backend.model = self.original_model
+        backend.rate_limit_buckets = self.original_buckets
+        backend.RATE_LIMIT_SESSION_PER_MINUTE = self.original_rate
+
+    def batch(self, questions):
+        response = self.client.post('/api/chat/batch', json={"questions": questions, "session_id": self.session_id})
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        return response, lines
+
+    def unusual_questions(self, size):
+        return [f"zqx unusual question {uuid.uuid4().hex}" for _ in range(size)]
+
+    def test_batch_larger_than_the_bucket_is_paced_not_refused(self):
+        extra = 5
+        started = time.monotonic()
+        response, lines = self.batch(self.unusual_questions(backend.RATE_LIMIT_SESSION_BURST + extra))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(lines[-1]["failed"], 0)
+        self.assertEqual(self.model.calls, backend.RATE_LIMIT_SESSION_BURST + extra)
+        # The burst goes at once; the rest waits for refills at 10 tokens a second
+        self.assertGreater(time.monotonic() - started, (extra - 1) / 10)
+
+    def test_cached_answers_are_not_charged(self):
+        question = self.unusual_questions(1)
+        self.batch(question)
+        # Empty the session bucket; cached questions must still be answered at once
+        backend.take_rate_limit_tokens(backend.RATE_LIMIT_SESSION_BURST - 1, "10.0.0.1", lambda: self.session_id)
+        backend.RATE_LIMIT_SESSION_PER_MINUTE = 0.001
+        response, lines = self.batch(question * 20)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({line.get("source") for line in lines[:-1]}, {"cache"})
+        self.assertEqual(self.model.calls, 1)
+
+
+class IPRateLimitTests(unittest.TestCase):
+    def setUp(self):
+        self.original_buckets = backend.rate_limit_buckets
+        self.original_by_ip = backend.RATE_LIMIT_BY_IP
+        backend.rate_limit_buckets = backend.InMemoryTokenBuckets()
+
+    def tearDown(self):
+        backend.rate_limit_buckets = self.original_buckets
+        backend.RATE_LIMIT_BY_IP = self.original_by_ip
+
+    def drain(self):
+        return [backend.take_rate_limit_tokens(1, "10.0.0.1") for _ in range(backend.RATE_LIMIT_IP_BURST + 1)]
+
+    @unittest.skipIf(backend.TRUSTED_PROXIES or 'RATE_LIMIT_BY_IP' in os.environ, "IP limits configured explicitly")
+    def test_ip_limits_are_off_without_trusted_proxies(self):
+        self.assertFalse(backend.RATE_LIMIT_BY_IP)
+        self.assertFalse(any(self.drain()))
+
+    def test_ip_limits_apply_when_enabled(self):
+        backend.RATE_LIMIT_BY_IP = True
+        self.assertGreater(self.drain()[-1], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
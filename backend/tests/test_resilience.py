@@ -0,0 +1,179 @@
+"""Tests for the Gemini circuit breaker and retry wrapper against a local fake client.
+
+Run from the repository root:
+
+    python -m unittest discover -s backend/tests
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as backend
+from google.api_core import exceptions as google_exceptions
+
+RESET_TIMEOUT = 0.05
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class ScriptedClient:
+    """Fake Gemini client that raises or answers according to a script, then answers 'ok'"""
+    def __init__(self, *outcomes, delay=0):
+        self.outcomes = list(outcomes)
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _next(self):
+        with self._lock:
+            self.calls += 1
+            outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+        time.sleep(self.delay)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    def generate_content(self, content, stream=False, request_options=None):
+        outcome = self._next()
+        if stream:
+            return iter([FakeResponse(outcome), FakeResponse("!")])
+        return FakeResponse(outcome)
+
+
+def unavailable():
+    return google_exceptions.ServiceUnavailable("unavailable")
+
+
+def invalid():
+    return google_exceptions.InvalidArgument("bad request")
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.breaker = backend.CircuitBreaker(failure_threshold=2, reset_timeout=RESET_TIMEOUT)
+
+    def test_opens_after_threshold_and_fails_fast(self):
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        with self.assertRaises(backend.CircuitOpenError) as raised:
+            self.breaker.before_call()
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+
+    def test_success_resets_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_half_open_admits_one_probe(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        time.sleep(RESET_TIMEOUT * 1.5)
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, 'half_open')
+        with self.assertRaises(backend.CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_probe_success_closes(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        time.sleep(RESET_TIMEOUT * 1.5)
+        self.breaker.before_call()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.breaker.before_call()
+
+    def test_probe_failure_reopens(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        time.sleep(RESET_TIMEOUT * 1.5)
+        self.breaker.before_call()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        with self.assertRaises(backend.CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_unrecorded_probe_does_not_wedge_half_open(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        time.sleep(RESET_TIMEOUT * 1.5)
+        self.breaker.before_call()  # Probe whose outcome is never recorded
+        time.sleep(RESET_TIMEOUT * 1.5)
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, 'half_open')
+
+
+class ResilientModelTests(unittest.TestCase):
+    def make_model(self, client, max_retries=2):
+        breaker = backend.CircuitBreaker(failure_threshold=2, reset_timeout=RESET_TIMEOUT)
+        return backend.ResilientModel(client, timeout=1, max_retries=max_retries,
+                                      base_delay=0, max_delay=0, breaker=breaker)
+
+    def test_retries_transient_errors(self):
+        client = ScriptedClient(unavailable())
+        model = self.make_model(client)
+        self.assertEqual(model.generate_content("hi").text, "ok")
+        self.assertEqual(client.calls, 2)
+        self.assertEqual(model.breaker.state, 'closed')
+
+    def test_gives_up_after_max_retries(self):
+        client = ScriptedClient(unavailable(), unavailable(), unavailable())
+        model = self.make_model(client, max_retries=1)
+        with self.assertRaises(google_exceptions.ServiceUnavailable):
+            model.generate_content("hi")
+        self.assertEqual(client.calls, 2)
+        self.assertEqual(model.breaker.state, 'open')
+
+    def test_does_not_retry_non_retryable_errors(self):
+        client = ScriptedClient(invalid())
+        model = self.make_model(client)
+        with self.assertRaises(google_exceptions.InvalidArgument):
+            model.generate_content("hi")
+        self.assertEqual(client.calls, 1)
+        self.assertEqual(model.breaker.state, 'closed')
+
+    def test_non_retryable_probe_closes_circuit(self):
+        client = ScriptedClient(unavailable(), unavailable(), invalid())
+        model = self.make_model(client, max_retries=1)
+        with self.assertRaises(google_exceptions.ServiceUnavailable):
+            model.generate_content("first")
+        self.assertEqual(model.breaker.state, 'open')
+        with self.assertRaises(backend.CircuitOpenError):
+            model.generate_content("refused")
+        time.sleep(RESET_TIMEOUT * 1.5)
+        with self.assertRaises(google_exceptions.InvalidArgument):
+            model.generate_content("probe")
+        self.assertEqual(model.breaker.state, 'closed')
+        self.assertEqual(model.generate_content("healthy").text, "ok")
+
+    def test_stream_retries_before_first_chunk(self):
+        client = ScriptedClient(unavailable())
+        model = self.make_model(client)
+        self.assertEqual([chunk.text for chunk in model.generate_content("hi", stream=True)], ["ok", "!"])
+        self.assertEqual(client.calls, 2)
+
+    def test_identical_concurrent_calls_are_coalesced(self):
+        client = ScriptedClient(delay=0.1)
+        model = self.make_model(client)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(model.generate_content("same").text))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["ok"] * 5)
+        self.assertEqual(client.calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+"""Tests for the persistent upload job queue, run against a temporary database.
+
+Run from the repository root:
+
+    python -m unittest discover -s backend/tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as backend
+
+
+class UploadJobQueueTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        for name in ('UPLOAD_JOB_RETRY_DELAY', 'UPLOAD_JOB_LEASE'):
+            self.addCleanup(setattr, backend, name, getattr(backend, name))
+        backend.UPLOAD_JOB_RETRY_DELAY = 0
+        self.handler = lambda payload: {"name": payload["file_info"]["name"], "content_preview": "text"}
+
+    def queue(self, max_attempts=3):
+        # No worker threads: the tests drive the queue one job at a time
+        return backend.UploadJobQueue(lambda payload: self.handler(payload), path=os.path.join(self.directory.name, 'jobs.db'),
+                                      workers=0, max_attempts=max_attempts)
+
+    def submit(self, queue):
+        return queue.submit({"file_info": {"name": "notes.pdf", "type": "pdf"}, "filepath": "unused"})
+
+    def test_failed_attempts_are_retried_then_the_job_fails(self):
+        def fail(payload):
+            raise TimeoutError("PDF extraction exceeded 10s")
+        self.handler = fail
+        queue = self.queue(max_attempts=3)
+        job_id = self.submit(queue)
+
+        self.assertTrue(queue._run_next())
+        job = queue.get(job_id)
+        self.assertEqual((job["status"], job["attempts"]), ('queued', 1))
+        self.assertEqual(job["error"], "PDF extraction exceeded 10s")
+
+        self.assertTrue(queue._run_next())
+        self.assertTrue(queue._run_next())
+        job = queue.get(job_id)
+        self.assertEqual((job["status"], job["attempts"]), ('failed', 3))
+        self.assertFalse(queue._run_next())
+
+    def test_retries_wait_for_the_backoff(self):
+        backend.UPLOAD_JOB_RETRY_DELAY = 60
+        def fail(payload):
+            raise TimeoutError("slow")
+        self.handler = fail
+        queue = self.queue()
+        job_id = self.submit(queue)
+        self.assertTrue(queue._run_next())
+        self.assertFalse(queue._run_next())
+        self.assertEqual(queue.get(job_id)["status"], 'queued')
+
+    def test_job_with_an_expired_lease_is_taken_again(self):
+        backend.UPLOAD_JOB_LEASE = -1  # Leases expire as soon as they are taken
+        queue = self.queue()
+        job_id = self.submit(queue)
+        self.assertIsNotNone(queue._claim())  # A worker takes the job and dies without finishing it
+        self.assertEqual(queue.get(job_id)["status"], 'running')
+
+        self.assertTrue(queue._run_next())
+        job = queue.get(job_id)
+        self.assertEqual((job["status"], job["attempts"]), ('completed', 2))
+        self.assertEqual(job["result"]["content_preview"], "text")
+
+    def test_expired_lease_on_the_last_attempt_fails_the_job(self):
+        backend.UPLOAD_JOB_LEASE = -1
+        queue = self.queue(max_attempts=1)
+        job_id = self.submit(queue)
+        queue._claim()
+        self.assertFalse(queue._run_next())
+        job = queue.get(job_id)
+        self.assertEqual(job["status"], 'failed')
+        self.assertEqual(job["error"], 'Processing was interrupted')
+
+    def test_cancelling_a_running_job_discards_its_result(self):
+        queue = self.queue()
+        job_id = self.submit(queue)
+        def cancelled_meanwhile(payload):
+            queue.cancel(job_id)  # Arrives from another request while the attempt runs
+            return {"name": "notes.pdf", "content_preview": "text"}
+        self.handler = cancelled_meanwhile
+
+        self.assertTrue(queue._run_next())
+        job = queue.get(job_id)
+        self.assertEqual(job["status"], 'cancelled')
+        self.assertIsNone(job["result"])
+        self.assertFalse(queue._run_next())
+
+    def test_completed_result_is_served_by_the_status_route(self):
+        queue = self.queue()
+        original_queue = backend.upload_jobs
+        backend.upload_jobs = queue
+        self.addCleanup(setattr, backend, 'upload_jobs', original_queue)
+        job_id = self.submit(queue)
+        client = backend.app.test_client()
+
+        body = client.get(f'/api/upload-status/{job_id}').get_json()
+        self.assertEqual(body["status"], 'queued')
+        self.assertNotIn("content_preview", body["file_info"])
+
+        queue._run_next()
+        body = client.get(f'/api/upload-status/{job_id}').get_json()
+        self.assertEqual((body["status"], body["progress"]), ('completed', 1))
+        self.assertEqual(body["file_info"], {"name": "notes.pdf", "content_preview": "text"})
+        self.assertEqual(client.get('/api/upload-status/missing').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
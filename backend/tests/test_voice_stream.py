@@ -0,0 +1,139 @@
+"""Tests for streaming voice recognition wake-ups.
+
+Run from the repository root:
+
+    python -m unittest discover -s backend/tests
+"""
+import io
+import os
+import struct
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as backend
+
+
+class FakeSpeechEngine:
+    """Returns a fixed transcript after a delay"""
+    def __init__(self, latency=0.05):
+        self.latency = latency
+
+    def transcribe(self, audio, language):
+        time.sleep(self.latency)
+        return "hello"
+
+
+def pcm(milliseconds, amplitude):
+    samples = backend.SPEECH_SAMPLE_RATE * milliseconds // 1000
+    return struct.pack(f"<{samples}h", *([amplitude, -amplitude] * (samples // 2)))
+
+
+class VoiceStreamWaitTests(unittest.TestCase):
+    def setUp(self):
+        self.original_engine = backend.speech_engines['google']
+        backend.speech_engines['google'] = FakeSpeechEngine()
+
+    def tearDown(self):
+        backend.speech_engines['google'] = self.original_engine
+
+    def test_update_before_wait_is_not_missed(self):
+        stream = backend.VoiceStream('en-US', 'google')
+        version = stream.version
+        stream._notify()  # Lands between the caller's check and its wait
+        started = time.monotonic()
+        self.assertTrue(stream.wait_for_update(version, timeout=5))
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_wait_until_done_returns_when_last_segment_finishes(self):
+        stream = backend.VoiceStream('en-US', 'google')
+        stream.feed(pcm(600, 3000) + pcm(backend.VAD_SILENCE_MS + 60, 0))
+        stream.finish()
+        started = time.monotonic()
+        self.assertTrue(stream.wait_until_done(timeout=5))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(stream.summary()["partial_transcript"], "hello")
+
+    def test_wait_until_done_after_segment_already_finished(self):
+        stream = backend.VoiceStream('en-US', 'google')
+        stream.feed(pcm(600, 3000) + pcm(backend.VAD_SILENCE_MS + 60, 0))
+        time.sleep(0.2)  # Segment completes before anyone waits
+        stream.finish()
+        started = time.monotonic()
+        self.assertTrue(stream.wait_until_done(timeout=5))
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_waiter_wakes_on_segment_completion(self):
+        stream = backend.VoiceStream('en-US', 'google')
+        woke = []
+        version = stream.version
+        waiter = threading.Thread(target=lambda: woke.append(stream.wait_for_update(version, timeout=5)))
+        waiter.start()
+        stream.feed(pcm(600, 3000) + pcm(backend.VAD_SILENCE_MS + 60, 0))
+        waiter.join(timeout=2)
+        self.assertEqual(woke, [True])
+
+
+class VoiceStreamLimitTests(unittest.TestCase):
+    def setUp(self):
+        self.original_engine = backend.speech_engines['google']
+        self.original_buckets = backend.rate_limit_buckets
+        backend.speech_engines['google'] = FakeSpeechEngine(latency=0)
+        backend.rate_limit_buckets = backend.InMemoryTokenBuckets()
+        self.client = backend.app.test_client()
+
+    def tearDown(self):
+        backend.speech_engines['google'] = self.original_engine
+        backend.rate_limit_buckets = self.original_buckets
+
+    def burst(self):
+        return pcm(90, 3000) + pcm(backend.VAD_SILENCE_MS + 30, 0)
+
+    def test_refused_segment_is_not_transcribed(self):
+        admitted = iter([0, 7])
+        stream = backend.VoiceStream('en-US', 'google', admit_segment=lambda: next(admitted))
+        self.assertEqual(stream.feed(self.burst()), 0)
+        self.assertEqual(stream.feed(self.burst()), 7)
+        stream.finish()
+        stream.wait_until_done(timeout=5)
+        segments = stream.summary()["segments"]
+        self.assertEqual([segment["text"] for segment in segments], ["hello", ""])
+        self.assertIn("error", segments[1])
+
+    def test_audio_per_stream_is_capped(self):
+        stream = backend.VoiceStream('en-US', 'google')
+        limit = backend.VOICE_STREAM_MAX_SECONDS * backend.SPEECH_SAMPLE_RATE * 2
+        self.assertTrue(stream.accepts(limit))
+        stream.feed(pcm(1000, 0))
+        self.assertFalse(stream.accepts(limit))
+
+    def test_chunked_audio_over_the_cap_is_refused(self):
+        original_limit = backend.VOICE_STREAM_MAX_SECONDS
+        backend.VOICE_STREAM_MAX_SECONDS = 1
+        self.addCleanup(setattr, backend, 'VOICE_STREAM_MAX_SECONDS', original_limit)
+        stream_id = self.client.post('/api/voice-stream', json={}).get_json()["stream_id"]
+        # No Content-Length, so the cap has to be checked against the body read
+        response = self.client.post(f'/api/voice-stream/{stream_id}/audio', input_stream=io.BytesIO(pcm(2000, 0)),
+                                    headers={"Transfer-Encoding": "chunked"},
+                                    environ_overrides={"wsgi.input_terminated": True})
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(backend.get_voice_stream(stream_id).summary()["segments"], [])
+
+    def test_segment_bursts_are_rate_limited_per_session(self):
+        response = self.client.post('/api/voice-stream', json={"session_id": "voice-limit-test"})
+        stream_id = response.get_json()["stream_id"]
+        statuses = []
+        for _ in range(backend.RATE_LIMIT_SESSION_BURST + 2):
+            response = self.client.post(f'/api/voice-stream/{stream_id}/audio', data=self.burst())
+            statuses.append(response.status_code)
+        self.assertEqual(statuses[0], 200)
+        self.assertEqual(statuses[-1], 429)
+        self.assertIn('Retry-After', response.headers)
+        self.assertIn("segments", response.get_json())
+
+
+if __name__ == '__main__':
+    unittest.main()
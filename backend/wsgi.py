@@ -0,0 +1,20 @@
+"""WSGI entry point for serving the backend with gunicorn's threaded workers.
+
+Run from the repository root, for example:
+
+    gunicorn -c backend/gunicorn.conf.py wsgi:app
+
+Every request holds one worker thread until its response is finished,
+including open SSE/NDJSON streams. A process therefore serves at
+most WEB_THREADS requests at a time; further connections wait in the
+listen backlog. Outstanding Gemini and speech calls are capped separately
+by UPSTREAM_CONCURRENCY, which should not exceed WEB_THREADS.
+
+One worker process is the default. Chat history, image handles, rate
+limits and voice streams are kept in process memory unless shared stores
+are configured, so gunicorn.conf.py refuses WEB_WORKERS above one without
+them, and voice streams are only offered with a single worker.
+"""
+from app import create_app
+
+app = create_app()